@@ -2,9 +2,13 @@ import cv2
 import numpy as np
 from datetime import datetime, date
 import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from database import DatabaseManager
 from face_recognition_module import FaceRecognitionSystem
-from gesture_detection import HandGestureDetector, FaceMovementDetector
+from gesture_detection import HandGestureDetector, FaceMovementDetector, bgr_to_rgb
+from session_students import SessionStudents
 
 class BehaviorTrackingSystem:
     def __init__(self):
@@ -20,14 +24,53 @@ class BehaviorTrackingSystem:
         
         # Session tracking
         self.session_start_time = None
-        self.active_students = {}  # student_id: {data}
+        self.session_date = None
+        self.session_date_iso = None
         self.attendance_marked = set()
         
+        # Per-student session data as parallel arrays
+        self.students = SessionStudents()
+        
         # Statistics
         self.total_frames = 0
         self.fps = 0
         self.last_fps_update = time.time()
         
+        # Face recognition runs every N frames; results are reused in between
+        self.recognition_interval = 2
+        self.frame_count = 0
+        self.last_recognized_students = []
+        
+        # Width of the downscaled frame fed to the detectors
+        self.inference_width = 640
+        
+        # Only every Nth processed frame is rendered to the preview window.
+        # Set display_pipeline to a GStreamer sink (e.g. "appsrc ! videoconvert !
+        # nvvidconv ! nvoverlaysink" on a Jetson) to send frames there instead.
+        self.display_interval = 2
+        self.display_pipeline = None
+        
+        # Reusable frame buffers (allocated on the first frame)
+        self._display_buffer = None
+        self._panel_buffer = None
+        self._small_buffer = None
+        self._rgb_buffer = None
+        
+        # Pre-rendered stats panel labels and cached FPS text
+        self._label_tiles = {}
+        self._fps_value = None
+        self._fps_text = ""
+        
+        # Database writes are handed to a background thread so disk I/O
+        # never stalls the capture loop
+        self._db_queue = queue.Queue()
+        self._db_thread = threading.Thread(target=self._db_worker, daemon=True)
+        self._db_thread.start()
+        
+        # Face recognition and hand detection run alongside face movement
+        # detection (dlib and MediaPipe release the GIL while they work)
+        self._pool = ThreadPoolExecutor(max_workers=2)
+        
         print("✓ All systems initialized successfully!")
         print()
     
@@ -49,14 +92,25 @@ class BehaviorTrackingSystem:
         # Set camera properties
         cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-        
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
+        # Grab frames on a dedicated thread so the loop below always gets the
+        # newest frame instead of a stale one queued in the driver
+        self._latest_frame = None
+        self._frame_lock = threading.Lock()
+        self._frame_ready = threading.Event()
+        self._grabbing = True
+        grab_thread = threading.Thread(target=self._grab_loop, args=(cap,), daemon=True)
+        grab_thread.start()
+        
+        display_writer = None
         paused = False
         
         try:
             while True:
                 if not paused:
-                    ret, frame = cap.read()
-                    if not ret:
+                    frame = self._next_frame()
+                    if frame is None:
                         print("Error: Could not read frame")
                         break
                     
@@ -64,7 +118,14 @@ class BehaviorTrackingSystem:
                     processed_frame = self._process_frame(frame)
                     
                     # Display frame
-                    cv2.imshow('Student Behavior Tracking System', processed_frame)
+                    if self.display_pipeline:
+                        if display_writer is None:
+                            h, w = processed_frame.shape[:2]
+                            display_writer = cv2.VideoWriter(self.display_pipeline, cv2.CAP_GSTREAMER,
+                                                             0, 30.0, (w, h))
+                        display_writer.write(processed_frame)
+                    elif self.frame_count % self.display_interval == 0:
+                        cv2.imshow('Student Behavior Tracking System', processed_frame)
                     
                     # Update FPS
                     self.total_frames += 1
@@ -92,133 +153,219 @@ class BehaviorTrackingSystem:
         
         finally:
             # Cleanup
+            self._grabbing = False
+            grab_thread.join(timeout=1.0)
             cap.release()
+            if display_writer is not None:
+                display_writer.release()
             cv2.destroyAllWindows()
             self._save_session_report()
             print("\n✓ Session ended and report saved")
     
+    def _grab_loop(self, cap):
+        """Continuously grab frames and publish the most recent one"""
+        while self._grabbing:
+            if not cap.grab():
+                break
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            
+            with self._frame_lock:
+                self._latest_frame = frame
+                self._frame_ready.set()
+        
+        # Wake up the main loop so it notices the camera has stopped
+        self._grabbing = False
+        self._frame_ready.set()
+    
+    def _next_frame(self):
+        """Wait for a frame newer than the last one returned (None if the camera stopped)"""
+        while True:
+            self._frame_ready.wait()
+            with self._frame_lock:
+                frame = self._latest_frame
+                self._latest_frame = None
+                self._frame_ready.clear()
+            
+            if frame is not None or not self._grabbing:
+                return frame
+    
     def _process_frame(self, frame):
         """Process a single frame"""
-        display_frame = frame.copy()
+        if self._display_buffer is None or self._display_buffer.shape != frame.shape:
+            self._display_buffer = np.empty_like(frame)
+        np.copyto(self._display_buffer, frame)
+        display_frame = self._display_buffer
         current_time = datetime.now()
-        current_date = date.today().isoformat()
+        now = time.monotonic()  # for the gesture debounce timers
         
-        # 1. Face Recognition
-        recognized_students = self.face_system.recognize_faces(frame)
-        display_frame = self.face_system.draw_face_boxes(display_frame, recognized_students)
+        # Only re-format the date when it rolls over
+        if current_time.date() != self.session_date:
+            self.session_date = current_time.date()
+            self.session_date_iso = self.session_date.isoformat()
+        current_date = self.session_date_iso
+        
+        # Downscale and convert once, and share the small RGB frame between
+        # all detectors (landmarks are normalized, boxes are scaled back up)
+        h, w = frame.shape[:2]
+        scale = self.inference_width / w
+        self._small_buffer = cv2.resize(frame, (self.inference_width, int(h * scale)),
+                                        dst=self._small_buffer, interpolation=cv2.INTER_AREA)
+        self._rgb_buffer = bgr_to_rgb(self._small_buffer, self._rgb_buffer)
+        rgb_frame = self._rgb_buffer
+        
+        # Run the three detectors concurrently on the shared frame
+        # (face recognition every N frames, reuse last result otherwise)
+        faces_future = None
+        if self.frame_count % self.recognition_interval == 0:
+            faces_future = self._pool.submit(self.face_system.recognize_faces_rgb, rgb_frame, scale)
+        self.frame_count += 1
+        hands_future = self._pool.submit(self.hand_detector.detect_hands_rgb, rgb_frame)
+        face_data, face_results = self.face_movement_detector.detect_face_movement_rgb(rgb_frame)
+        
+        if faces_future is not None:
+            self.last_recognized_students = faces_future.result()
+        hand_data, hand_results = hands_future.result()
         
-        # Update active students and mark attendance
-        for student in recognized_students:
-            if student['student_id']:
+        # 1. Face Recognition
+        recognized_students = self.last_recognized_students
+        # Skip drawing and bookkeeping entirely when no one is in view
+        if recognized_students:
+            display_frame = self.face_system.draw_face_boxes(display_frame, recognized_students)
+            
+            # Update active students and mark attendance
+            timestamp = current_time.timestamp()
+            students = self.students
+            student_index = students.student_index
+            for student in recognized_students:
                 student_id = student['student_id']
+                if not student_id:
+                    continue
                 
                 # Initialize student data if new
-                if student_id not in self.active_students:
-                    self.active_students[student_id] = {
-                        'name': student['name'],
-                        'first_seen': current_time,
-                        'last_seen': current_time,
-                        'hand_raises': 0,
-                        'looking_away_count': 0,
-                        'attention_scores': [],
-                        'total_frames': 0
-                    }
+                row = student_index.get(student_id)
+                if row is None:
+                    row = students.add(student_id, student['name'], timestamp)
                 
                 # Update last seen
-                self.active_students[student_id]['last_seen'] = current_time
-                self.active_students[student_id]['total_frames'] += 1
+                students.last_seen[row] = timestamp
+                students.total_frames_seen[row] += 1
                 
                 # Mark attendance (once per day)
                 if student_id not in self.attendance_marked:
                     time_in = current_time.strftime("%H:%M:%S")
-                    self.db.mark_attendance(student_id, current_date, time_in)
+                    self._db_queue.put(('attendance', (student_id, current_date, time_in)))
                     self.attendance_marked.add(student_id)
                     print(f"✓ Attendance marked for {student['name']} at {time_in}")
         
+        # Rows [0, active_count) hold the students seen so far this session
+        students = self.students
+        active_count = len(students)
+        
         # 2. Hand Gesture Detection
-        hand_data, hand_results = self.hand_detector.detect_hands(frame)
         if hand_data['hands_detected']:
             display_frame = self.hand_detector.draw_hand_landmarks(display_frame, hand_results)
             
             # Check for hand raise
             if hand_data['hand_raised']:
-                new_raise = self.hand_detector.update_hand_raise_count(True)
+                new_raise = self.hand_detector.update_hand_raise_count(True, now)
                 if new_raise:
                     # Attribute hand raise to visible students
-                    for student_id in self.active_students.keys():
-                        self.active_students[student_id]['hand_raises'] += 1
+                    students.hand_raises[:active_count] += 1
                     print(f"✋ Hand raised detected!")
             else:
-                self.hand_detector.update_hand_raise_count(False)
+                self.hand_detector.update_hand_raise_count(False, now)
         
         # 3. Face Movement Detection
-        face_data, face_results = self.face_movement_detector.detect_face_movement(frame)
-        
         if face_data['face_detected']:
             # Update attention scores for active students
-            for student_id in self.active_students.keys():
-                self.active_students[student_id]['attention_scores'].append(
-                    face_data['attention_score']
-                )
+            score = face_data['attention_score']
+            students.attention_sum[:active_count] += score
+            students.attention_count[:active_count] += 1
             
             # Check if looking away
             if face_data['looking_away']:
-                new_looking_away = self.face_movement_detector.update_looking_away_count(True)
+                new_looking_away = self.face_movement_detector.update_looking_away_count(True, now)
                 if new_looking_away:
-                    for student_id in self.active_students.keys():
-                        self.active_students[student_id]['looking_away_count'] += 1
+                    students.looking_away_counts[:active_count] += 1
                     print(f"👀 Student looking away detected!")
             else:
-                self.face_movement_detector.update_looking_away_count(False)
+                self.face_movement_detector.update_looking_away_count(False, now)
         
         # 4. Draw UI overlay
-        display_frame = self._draw_ui_overlay(display_frame, face_data, hand_data)
+        display_frame = self._draw_ui_overlay(display_frame, face_data, hand_data, current_time)
         
         return display_frame
     
-    def _draw_ui_overlay(self, frame, face_data, hand_data):
+    def _db_worker(self):
+        """Apply queued database writes until a None sentinel is received"""
+        while True:
+            task = self._db_queue.get()
+            try:
+                if task is None:
+                    break
+                
+                action, args = task
+                if action == 'attendance':
+                    self.db.mark_attendance(*args)
+            finally:
+                self._db_queue.task_done()
+    
+    def _draw_ui_overlay(self, frame, face_data, hand_data, current_time):
         """Draw UI overlay with statistics"""
         h, w = frame.shape[:2]
         
-        # Create semi-transparent overlay for stats panel
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (10, 10), (400, 300), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.6, frame, 0.4, 0, frame)
+        # Darken the stats panel in place (same as blending in a 60% black rectangle)
+        panel = frame[10:301, 10:401]
+        if self._panel_buffer is None or self._panel_buffer.shape != panel.shape:
+            self._panel_buffer = np.empty_like(panel)
+        cv2.convertScaleAbs(panel, dst=self._panel_buffer, alpha=0.4)
+        panel[:] = self._panel_buffer
+        
+        # Static labels come from a cached tile; only the values are drawn per frame
+        hand_raised = hand_data.get('hand_raised', False)
+        looking_away = face_data.get('looking_away', False)
+        label_tile, label_mask, value_x = self._get_label_tile(panel.shape, hand_raised, looking_away)
+        np.copyto(panel, label_tile, where=label_mask)
         
         # Session info
         y_offset = 40
         line_height = 30
         
         if self.session_start_time:
-            duration = datetime.now() - self.session_start_time
+            duration = current_time - self.session_start_time
             duration_str = str(duration).split('.')[0]
-            cv2.putText(frame, f"Session Duration: {duration_str}", 
-                       (20, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            cv2.putText(frame, duration_str, 
+                       (value_x[0], y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
         y_offset += line_height
         
-        # FPS
-        cv2.putText(frame, f"FPS: {self.fps:.1f}", 
-                   (20, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        # FPS (only re-formatted when it changes, about once per second)
+        if self.fps != self._fps_value:
+            self._fps_value = self.fps
+            self._fps_text = f"{self.fps:.1f}"
+        cv2.putText(frame, self._fps_text, 
+                   (value_x[1], y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
         y_offset += line_height
         
         # Active students
-        active_count = len(self.active_students)
-        cv2.putText(frame, f"Active Students: {active_count}", 
-                   (20, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        active_count = len(self.students)
+        cv2.putText(frame, str(active_count), 
+                   (value_x[2], y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
         y_offset += line_height
         
         # Hand raises
         total_hand_raises = self.hand_detector.get_hand_raise_count()
-        color = (0, 255, 255) if hand_data.get('hand_raised', False) else (255, 255, 255)
-        cv2.putText(frame, f"Hand Raises: {total_hand_raises}", 
-                   (20, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+        color = (0, 255, 255) if hand_raised else (255, 255, 255)
+        cv2.putText(frame, str(total_hand_raises), 
+                   (value_x[3], y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
         y_offset += line_height
         
         # Looking away count
         total_looking_away = self.face_movement_detector.get_looking_away_count()
-        color = (0, 0, 255) if face_data.get('looking_away', False) else (255, 255, 255)
-        cv2.putText(frame, f"Looking Away: {total_looking_away}", 
-                   (20, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+        color = (0, 0, 255) if looking_away else (255, 255, 255)
+        cv2.putText(frame, str(total_looking_away), 
+                   (value_x[4], y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
         y_offset += line_height
         
         # Attention score
@@ -236,15 +383,16 @@ class BehaviorTrackingSystem:
                        (20, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
         
         # Student list
-        if self.active_students:
+        students = self.students
+        if len(students):
             y_offset = 330
             cv2.putText(frame, "Active Students:", 
                        (20, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
             y_offset += 25
             
-            for student_id, data in list(self.active_students.items())[:5]:  # Show max 5
-                avg_attention = np.mean(data['attention_scores']) if data['attention_scores'] else 0
-                text = f"{data['name']}: Att={avg_attention:.0f}% HR={data['hand_raises']}"
+            shown = min(5, len(students))  # Show max 5
+            for row, avg_attention in enumerate(students.average_attention(shown).tolist()):
+                text = f"{students.student_names[row]}: Att={avg_attention:.0f}% HR={students.hand_raises[row]}"
                 cv2.putText(frame, text, 
                            (30, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
                 y_offset += 22
@@ -261,14 +409,42 @@ class BehaviorTrackingSystem:
         
         return frame
     
+    def _get_label_tile(self, panel_shape, hand_raised, looking_away):
+        """Return the cached (tile, mask, value x positions) for the stats panel labels"""
+        key = (panel_shape, hand_raised, looking_away)
+        if key not in self._label_tiles:
+            labels = [
+                ("Session Duration: ", (255, 255, 255)),
+                ("FPS: ", (255, 255, 255)),
+                ("Active Students: ", (0, 255, 0)),
+                ("Hand Raises: ", (0, 255, 255) if hand_raised else (255, 255, 255)),
+                ("Looking Away: ", (0, 0, 255) if looking_away else (255, 255, 255)),
+            ]
+            
+            # The panel starts at (10, 10), so draw 10 px up and left of the frame positions
+            tile = np.zeros(panel_shape, dtype=np.uint8)
+            value_x = []
+            y_offset = 40
+            for label, color in labels:
+                cv2.putText(tile, label, (10, y_offset - 10),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+                # Pen advance of the label (getTextSize pads for thickness, so
+                # measure against a reference character)
+                (with_label, _), _ = cv2.getTextSize(label + "0", cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+                (without_label, _), _ = cv2.getTextSize("0", cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+                value_x.append(20 + with_label - without_label)
+                y_offset += 30
+            
+            mask = tile.any(axis=2, keepdims=True)
+            self._label_tiles[key] = (tile, mask, value_x)
+        
+        return self._label_tiles[key]
+    
     def _reset_statistics(self):
         """Reset session statistics"""
         self.hand_detector.reset_count()
         self.face_movement_detector.reset_count()
-        for student_id in self.active_students:
-            self.active_students[student_id]['hand_raises'] = 0
-            self.active_students[student_id]['looking_away_count'] = 0
-            self.active_students[student_id]['attention_scores'] = []
+        self.students.reset_counts()
     
     def _save_session_report(self):
         """Save session report to database"""
@@ -283,31 +459,27 @@ class BehaviorTrackingSystem:
         print("=" * 60)
         print(f"Date: {session_date}")
         print(f"Duration: {session_duration / 60:.1f} minutes")
-        print(f"Total Students: {len(self.active_students)}")
+        print(f"Total Students: {len(self.students)}")
         print("-" * 60)
         
-        for student_id, data in self.active_students.items():
-            # Calculate average attention score
-            avg_attention = np.mean(data['attention_scores']) if data['attention_scores'] else 0
-            
-            # Calculate student's session duration
-            student_duration = (data['last_seen'] - data['first_seen']).total_seconds()
-            
-            print(f"\nStudent: {data['name']} (ID: {student_id})")
-            print(f"  Attention Score: {avg_attention:.1f}%")
-            print(f"  Hand Raises: {data['hand_raises']}")
-            print(f"  Looking Away Count: {data['looking_away_count']}")
-            print(f"  Time Present: {student_duration / 60:.1f} minutes")
-            
-            # Save to database
-            self.db.log_behavior(
-                student_id=student_id,
-                session_date=session_date,
-                attention_score=avg_attention,
-                hand_raises=data['hand_raises'],
-                looking_away_count=data['looking_away_count'],
-                total_duration=int(student_duration)
-            )
+        # Compute every student's averages and durations in one pass over the arrays
+        students = self.students
+        count = len(students)
+        rows = list(zip(students.student_ids, [session_date] * count,
+                        students.average_attention().tolist(),
+                        students.hand_raises[:count].tolist(),
+                        students.looking_away_counts[:count].tolist(),
+                        students.durations().tolist()))
+        
+        for row, (student_id, _, attention, raises, looking_away, duration) in enumerate(rows):
+            print(f"\nStudent: {students.student_names[row]} (ID: {student_id})")
+            print(f"  Attention Score: {attention:.1f}%")
+            print(f"  Hand Raises: {raises}")
+            print(f"  Looking Away Count: {looking_away}")
+            print(f"  Time Present: {duration / 60:.1f} minutes")
+        
+        # Save all students to database in one transaction
+        self.db.log_behaviors(rows)
         
         print("\n" + "=" * 60)
         print("✓ Report saved to database")
@@ -315,8 +487,14 @@ class BehaviorTrackingSystem:
     
     def cleanup(self):
         """Cleanup resources"""
+        self._pool.shutdown(wait=True)
         self.hand_detector.release()
         self.face_movement_detector.release()
+        
+        # Flush pending database writes before closing the connection
+        self._db_queue.put(None)
+        self._db_thread.join()
+        self.db.close()
 
 if __name__ == "__main__":
     try:
@@ -1,16 +1,29 @@
 import sqlite3
 import os
+import threading
 from datetime import datetime
 
 class DatabaseManager:
     def __init__(self, db_name="student_behavior.db"):
         self.db_name = db_name
+        
+        # One long-lived connection shared by all callers (guarded by a lock)
+        self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.lock = threading.Lock()
+        
         self.init_database()
     
     def init_database(self):
         """Initialize database with required tables"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self.lock:
+            self._create_tables()
+        print("Database initialized successfully!")
+    
+    def _create_tables(self):
+        """Create tables if they do not exist yet"""
+        cursor = self.conn.cursor()
         
         # Students table
         cursor.execute('''
@@ -53,21 +66,16 @@ class DatabaseManager:
             )
         ''')
         
-        conn.commit()
-        conn.close()
-        print("Database initialized successfully!")
+        self.conn.commit()
     
     def add_student(self, student_id, name, email, class_name):
         """Add a new student to the database"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO students (student_id, name, email, class_name)
-                VALUES (?, ?, ?, ?)
-            ''', (student_id, name, email, class_name))
-            conn.commit()
-            conn.close()
+            with self.lock, self.conn:
+                self.conn.execute('''
+                    INSERT INTO students (student_id, name, email, class_name)
+                    VALUES (?, ?, ?, ?)
+                ''', (student_id, name, email, class_name))
             return True, "Student added successfully!"
         except sqlite3.IntegrityError:
             return False, "Student ID already exists!"
@@ -76,24 +84,22 @@ class DatabaseManager:
     
     def get_all_students(self):
         """Get all students from database"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM students')
-        students = cursor.fetchall()
-        conn.close()
+        with self.lock:
+            students = self.conn.execute('SELECT * FROM students').fetchall()
         return students
     
     def mark_attendance(self, student_id, date, time_in, status='Present'):
         """Mark attendance for a student"""
+        return self.mark_attendances([(student_id, date, time_in, status)])
+    
+    def mark_attendances(self, rows):
+        """Mark attendance for many students in one transaction"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO attendance (student_id, date, time_in, status)
-                VALUES (?, ?, ?, ?)
-            ''', (student_id, date, time_in, status))
-            conn.commit()
-            conn.close()
+            with self.lock, self.conn:
+                self.conn.executemany('''
+                    INSERT OR REPLACE INTO attendance (student_id, date, time_in, status)
+                    VALUES (?, ?, ?, ?)
+                ''', rows)
             return True
         except Exception as e:
             print(f"Error marking attendance: {str(e)}")
@@ -102,18 +108,19 @@ class DatabaseManager:
     def log_behavior(self, student_id, session_date, attention_score, 
                      hand_raises, looking_away_count, total_duration):
         """Log student behavior data"""
+        return self.log_behaviors([(student_id, session_date, attention_score, hand_raises,
+                                    looking_away_count, total_duration)])
+    
+    def log_behaviors(self, rows):
+        """Log behavior data for many students in one transaction"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO behavior_logs 
-                (student_id, session_date, attention_score, hand_raises, 
-                 looking_away_count, total_duration)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (student_id, session_date, attention_score, hand_raises, 
-                  looking_away_count, total_duration))
-            conn.commit()
-            conn.close()
+            with self.lock, self.conn:
+                self.conn.executemany('''
+                    INSERT INTO behavior_logs 
+                    (student_id, session_date, attention_score, hand_raises, 
+                     looking_away_count, total_duration)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
             return True
         except Exception as e:
             print(f"Error logging behavior: {str(e)}")
@@ -121,9 +128,6 @@ class DatabaseManager:
     
     def get_student_report(self, student_id, start_date=None, end_date=None):
         """Get behavior report for a student"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
         query = '''
             SELECT session_date, attention_score, hand_raises, 
                    looking_away_count, total_duration
@@ -139,10 +143,14 @@ class DatabaseManager:
         
         query += ' ORDER BY session_date DESC'
         
-        cursor.execute(query, params)
-        report = cursor.fetchall()
-        conn.close()
+        with self.lock:
+            report = self.conn.execute(query, params).fetchall()
         return report
+    
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.conn.close()
 
 if __name__ == "__main__":
     # Test database
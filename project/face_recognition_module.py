@@ -1,38 +1,170 @@
 import face_recognition
+import dlib
 import cv2
 import numpy as np
 import pickle
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _nearest_known(known, probes):
+        """Index and L2 distance of the nearest known encoding for each probe"""
+        best_indices = np.full(probes.shape[0], -1, dtype=np.int64)
+        best_distances = np.full(probes.shape[0], np.inf, dtype=np.float32)
+        for i in prange(probes.shape[0]):
+            best = np.inf
+            best_index = -1
+            for k in range(known.shape[0]):
+                total = 0.0
+                for d in range(known.shape[1]):
+                    diff = known[k, d] - probes[i, d]
+                    total += diff * diff
+                if total < best:
+                    best = total
+                    best_index = k
+            best_indices[i] = best_index
+            best_distances[i] = np.sqrt(best)
+        return best_indices, best_distances
+else:
+    _nearest_known = None
+
+def _box_iou(box_a, box_b):
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top = max(box_a[0], box_b[0])
+    right = min(box_a[1], box_b[1])
+    bottom = min(box_a[2], box_b[2])
+    left = max(box_a[3], box_b[3])
+    
+    intersection = max(0, right - left) * max(0, bottom - top)
+    if intersection == 0:
+        return 0.0
+    
+    area_a = (box_a[1] - box_a[3]) * (box_a[2] - box_a[0])
+    area_b = (box_b[1] - box_b[3]) * (box_b[2] - box_b[0])
+    return intersection / float(area_a + area_b - intersection)
+
+def encode_face_image(image_path):
+    """Encode the single face in an image file; returns (encoding, message), encoding is None on failure"""
+    # Module-level so it can run in worker processes
+    try:
+        # Load image
+        image = face_recognition.load_image_file(image_path)
+        
+        # Get face encoding
+        face_encodings = face_recognition.face_encodings(image)
+        
+        if len(face_encodings) == 0:
+            return None, "No face detected in the image!"
+        
+        if len(face_encodings) > 1:
+            return None, "Multiple faces detected! Please use an image with only one face."
+        
+        return face_encodings[0], "Face encoded"
+    
+    except Exception as e:
+        return None, f"Error registering student: {str(e)}"
+
 class FaceRecognitionSystem:
-    def __init__(self, encodings_file="face_encodings.pkl"):
+    def __init__(self, encodings_file="face_encodings.pkl", device=None):
         self.encodings_file = encodings_file
         self.known_face_encodings = []
         self.known_face_names = []
         self.known_student_ids = []
+        
+        # Detection runs on a downscaled copy of the frame; boxes are scaled back up
+        self.detection_scale = 0.25
+        self.match_tolerance = 0.6
+        
+        # With a CUDA build of dlib and a GPU present use the CNN detector on
+        # the GPU. device is 'cuda', 'cpu' or None to pick automatically
+        self.use_cuda = device != 'cpu' and self._cuda_available()
+        if device == 'cuda' and not self.use_cuda:
+            print("CUDA requested but dlib cannot use a GPU; running on the CPU")
+        self.detection_model = 'cnn' if self.use_cuda else 'hog'
+        
+        # OpenCV's ResNet-SSD face detector is much faster than HOG on CPU;
+        # it is used when its model files are present next to the encodings
+        self.dnn_prototxt = "deploy.prototxt"
+        self.dnn_model = "res10_300x300_ssd_iter_140000.caffemodel"
+        self.dnn_confidence = 0.5
+        self._face_net = None
+        if os.path.exists(self.dnn_prototxt) and os.path.exists(self.dnn_model):
+            self._face_net = cv2.dnn.readNetFromCaffe(self.dnn_prototxt, self.dnn_model)
+        
+        # Known encodings stacked into a (K, 128) matrix for vectorized matching
+        self._known_matrix = np.empty((0, 128), dtype=np.float32)
+        self._faiss_index = None
+        
+        # Recently identified faces; a face overlapping one of these reuses its
+        # identity instead of being re-encoded, until its ttl runs out
+        self._recent_tracks = []
+        self.track_ttl = 30
+        self.track_iou_threshold = 0.5
+        
         self.load_encodings()
     
+    @staticmethod
+    def _cuda_available():
+        """Whether dlib was built with CUDA and can see a GPU"""
+        if not getattr(dlib, 'DLIB_USE_CUDA', False):
+            return False
+        try:
+            return dlib.cuda.get_num_devices() > 0
+        except Exception:
+            return False
+    
     def load_encodings(self):
         """Load face encodings from file"""
         if os.path.exists(self.encodings_file):
             try:
                 with open(self.encodings_file, 'rb') as f:
                     data = pickle.load(f)
-                    self.known_face_encodings = data['encodings']
+                    # Stored as float16 (older files hold float64 lists); match in float32
+                    self.known_face_encodings = list(np.asarray(data['encodings'], dtype=np.float32))
                     self.known_face_names = data['names']
                     self.known_student_ids = data['student_ids']
+                self._rebuild_known_matrix()
                 print(f"Loaded {len(self.known_face_names)} face encodings")
             except Exception as e:
                 print(f"Error loading encodings: {str(e)}")
         else:
             print("No existing encodings found. Starting fresh.")
     
+    def _rebuild_known_matrix(self):
+        """Stack known encodings into a single float32 matrix"""
+        if self.known_face_encodings:
+            self._known_matrix = np.asarray(self.known_face_encodings, dtype=np.float32)
+        else:
+            self._known_matrix = np.empty((0, 128), dtype=np.float32)
+        self._known_sq_norms = np.einsum('ij,ij->i', self._known_matrix, self._known_matrix)
+        
+        # Use a FAISS flat L2 index (SIMD search) when faiss is installed
+        self._faiss_index = None
+        if faiss is not None and len(self._known_matrix) > 0:
+            self._faiss_index = faiss.IndexFlatL2(self._known_matrix.shape[1])
+            self._faiss_index.add(np.ascontiguousarray(self._known_matrix))
+        
+        # Identities cached from the old set of known faces may be stale
+        self._recent_tracks = []
+    
     def save_encodings(self):
         """Save face encodings to file"""
         try:
+            # float16 halves the file size and is plenty for 128-d face encodings
             data = {
-                'encodings': self.known_face_encodings,
+                'encodings': self._known_matrix.astype(np.float16),
                 'names': self.known_face_names,
                 'student_ids': self.known_student_ids
             }
@@ -46,31 +178,44 @@ class FaceRecognitionSystem:
     
     def register_student(self, image_path, student_id, name):
         """Register a new student's face"""
-        try:
-            # Load image
-            image = face_recognition.load_image_file(image_path)
-            
-            # Get face encoding
-            face_encodings = face_recognition.face_encodings(image)
-            
-            if len(face_encodings) == 0:
-                return False, "No face detected in the image!"
-            
-            if len(face_encodings) > 1:
-                return False, "Multiple faces detected! Please use an image with only one face."
+        face_encoding, message = encode_face_image(image_path)
+        if face_encoding is None:
+            return False, message
+        
+        # Add to known faces
+        self.known_face_encodings.append(face_encoding)
+        self.known_face_names.append(name)
+        self.known_student_ids.append(student_id)
+        self._rebuild_known_matrix()
+        
+        # Save encodings
+        self.save_encodings()
+        
+        return True, f"Student {name} registered successfully!"
+    
+    def register_students(self, entries, workers=None):
+        """Register many (image_path, student_id, name) entries; returns a (success, message) per entry"""
+        # Images are decoded and encoded on all cores (workers=None uses every
+        # CPU); the known faces are updated and saved once, in this process
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            encoded = list(pool.map(encode_face_image, [entry[0] for entry in entries]))
+        
+        results = []
+        for (image_path, student_id, name), (face_encoding, message) in zip(entries, encoded):
+            if face_encoding is None:
+                results.append((False, message))
+                continue
             
-            # Add to known faces
-            self.known_face_encodings.append(face_encodings[0])
+            self.known_face_encodings.append(face_encoding)
             self.known_face_names.append(name)
             self.known_student_ids.append(student_id)
-            
-            # Save encodings
+            results.append((True, f"Student {name} registered successfully!"))
+        
+        if any(success for success, _ in results):
+            self._rebuild_known_matrix()
             self.save_encodings()
-            
-            return True, f"Student {name} registered successfully!"
         
-        except Exception as e:
-            return False, f"Error registering student: {str(e)}"
+        return results
     
     def register_student_from_camera(self, student_id, name):
         """Register a student using webcam"""
@@ -135,6 +280,7 @@ class FaceRecognitionSystem:
             self.known_face_encodings.append(face_encoding)
             self.known_face_names.append(name)
             self.known_student_ids.append(student_id)
+            self._rebuild_known_matrix()
             
             # Save encodings
             self.save_encodings()
@@ -144,44 +290,153 @@ class FaceRecognitionSystem:
     
     def recognize_faces(self, frame):
         """Recognize faces in a frame"""
+        # Shrink the frame before detection; HOG cost scales with pixel count
+        small_frame = cv2.resize(frame, (0, 0), fx=self.detection_scale, fy=self.detection_scale)
+        
         # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
         
+        return self._recognize_small_rgb(rgb_small_frame)
+    
+    def recognize_faces_rgb(self, rgb_frame, frame_scale=1.0):
+        """Recognize faces in a frame that is already converted to RGB"""
+        # frame_scale is the size of rgb_frame relative to the original frame;
+        # returned locations always refer to the original frame
+        resize = self.detection_scale / frame_scale
+        rgb_small_frame = rgb_frame
+        if resize != 1.0:
+            rgb_small_frame = cv2.resize(rgb_frame, (0, 0), fx=resize, fy=resize)
+        elif not rgb_frame.flags.writeable:
+            # dlib needs a writable buffer; shared frames may be read-only
+            rgb_small_frame = rgb_frame.copy()
+        return self._recognize_small_rgb(rgb_small_frame)
+    
+    def _recognize_small_rgb(self, rgb_small_frame):
+        """Detect, encode and match faces in a downscaled RGB frame"""
         # Find all faces in frame
-        face_locations = face_recognition.face_locations(rgb_frame)
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+        if self._face_net is not None:
+            face_locations = self._detect_faces_dnn(rgb_small_frame)
+        else:
+            face_locations = face_recognition.face_locations(rgb_small_frame, model=self.detection_model)
+        return self._identify_faces(rgb_small_frame, face_locations)
+    
+    def _detect_faces_dnn(self, rgb_frame):
+        """Detect faces with the OpenCV DNN detector, as (top, right, bottom, left) boxes"""
+        h, w = rgb_frame.shape[:2]
         
-        recognized_students = []
+        # The Caffe model expects BGR with the mean subtracted
+        blob = cv2.dnn.blobFromImage(rgb_frame, 1.0, (300, 300), (104.0, 177.0, 123.0), swapRB=True)
+        self._face_net.setInput(blob)
+        detections = self._face_net.forward()
         
-        for face_encoding, face_location in zip(face_encodings, face_locations):
-            # Check if face matches known faces
-            matches = face_recognition.compare_faces(
-                self.known_face_encodings, face_encoding, tolerance=0.6
-            )
-            
-            name = "Unknown"
-            student_id = None
+        face_locations = []
+        for i in range(detections.shape[2]):
+            if detections[0, 0, i, 2] < self.dnn_confidence:
+                continue
             
-            # Find best match
-            face_distances = face_recognition.face_distance(
-                self.known_face_encodings, face_encoding
+            left, top, right, bottom = (detections[0, 0, i, 3:7] * [w, h, w, h]).astype(int).tolist()
+            left, top = max(0, left), max(0, top)
+            right, bottom = min(w, right), min(h, bottom)
+            if right > left and bottom > top:
+                face_locations.append((top, right, bottom, left))
+        
+        return face_locations
+    
+    def _identify_faces(self, rgb_small_frame, face_locations):
+        """Encode and match faces found in a downscaled RGB frame"""
+        # Empty frame: nothing to encode, and no faces left to track
+        if not face_locations:
+            self._recent_tracks = []
+            return []
+        
+        # Faces that overlap a recently identified face keep its identity;
+        # only the remaining faces go through the (expensive) encoder
+        identities = [None] * len(face_locations)
+        tracks = []
+        for i, face_location in enumerate(face_locations):
+            track = self._find_track(face_location)
+            if track is not None:
+                identities[i] = track['identity']
+                tracks.append({'location': face_location, 'identity': track['identity'],
+                               'ttl': track['ttl'] - 1})
+        
+        to_encode = [i for i, identity in enumerate(identities) if identity is None]
+        if to_encode:
+            face_encodings = face_recognition.face_encodings(
+                rgb_small_frame, [face_locations[i] for i in to_encode]
             )
             
-            if len(face_distances) > 0:
-                best_match_index = np.argmin(face_distances)
-                if matches[best_match_index]:
-                    name = self.known_face_names[best_match_index]
-                    student_id = self.known_student_ids[best_match_index]
+            # Match every encoded face against all known faces in one go
+            best_indices, best_distances = self._match_encodings(face_encodings)
             
+            for i, best_match_index, distance in zip(to_encode, best_indices, best_distances):
+                identity = ("Unknown", None, 0)
+                if best_match_index >= 0 and distance <= self.match_tolerance:
+                    identity = (self.known_face_names[best_match_index],
+                                self.known_student_ids[best_match_index],
+                                1 - distance)
+                identities[i] = identity
+                tracks.append({'location': face_locations[i], 'identity': identity,
+                               'ttl': self.track_ttl})
+        
+        self._recent_tracks = tracks
+        
+        # Scale face locations back up to the original frame size
+        factor = 1 / self.detection_scale
+        recognized_students = []
+        
+        for (top, right, bottom, left), (name, student_id, confidence) in zip(face_locations, identities):
             recognized_students.append({
                 'name': name,
                 'student_id': student_id,
-                'location': face_location,
-                'confidence': 1 - face_distances[best_match_index] if len(face_distances) > 0 and matches[best_match_index] else 0
+                'location': (int(top * factor), int(right * factor), int(bottom * factor), int(left * factor)),
+                'confidence': confidence
             })
         
         return recognized_students
     
+    def _find_track(self, face_location):
+        """Return the recent track that best overlaps a face location, if any"""
+        best_track = None
+        best_iou = self.track_iou_threshold
+        
+        for track in self._recent_tracks:
+            if track['ttl'] <= 0:
+                continue
+            iou = _box_iou(track['location'], face_location)
+            if iou > best_iou:
+                best_track = track
+                best_iou = iou
+        
+        return best_track
+    
+    def _match_encodings(self, face_encodings):
+        """Find the closest known face for each encoding (index -1 if none)"""
+        if len(face_encodings) == 0 or len(self.known_face_encodings) == 0:
+            count = len(face_encodings)
+            return np.full(count, -1), np.full(count, np.inf)
+        
+        probes = np.asarray(face_encodings, dtype=np.float32)
+        
+        if self._faiss_index is not None:
+            # FAISS returns squared L2 distances
+            squared_distances, indices = self._faiss_index.search(probes, 1)
+            return indices[:, 0], np.sqrt(squared_distances[:, 0])
+        
+        if _nearest_known is not None:
+            # JIT-compiled loop, avoids the (faces, known, 128) temporary below
+            return _nearest_known(self._known_matrix, probes)
+        
+        # (faces, known) squared distances as |p|^2 + |k|^2 - 2 p.k, so the
+        # bulk of the work is a single matrix product
+        squared_distances = self._known_sq_norms[None, :] - 2.0 * (probes @ self._known_matrix.T)
+        best_indices = squared_distances.argmin(axis=1)
+        best_squared = squared_distances[np.arange(len(probes)), best_indices]
+        best_squared += np.einsum('ij,ij->i', probes, probes)
+        
+        # Rounding can push a near-zero distance slightly negative
+        return best_indices, np.sqrt(np.maximum(best_squared, 0.0))
+    
     def draw_face_boxes(self, frame, recognized_students):
         """Draw boxes around recognized faces"""
         for student in recognized_students:
@@ -1,35 +1,171 @@
 import cv2
+import math
 import mediapipe as mp
 import numpy as np
-from datetime import datetime
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from mediapipe.tasks import python as mp_tasks
+from mediapipe.tasks.python import vision
+
+def bgr_to_rgb(frame, buffer=None, width=None):
+    """Convert a BGR frame to read-only RGB, reusing buffer when its shape matches"""
+    # Optionally downscale to width first; MediaPipe landmarks are normalized,
+    # so results still line up with the original frame
+    if width is not None and frame.shape[1] > width:
+        h, w = frame.shape[:2]
+        frame = cv2.resize(frame, (width, int(h * width / w)), interpolation=cv2.INTER_AREA)
+    
+    if buffer is None or buffer.shape != frame.shape:
+        buffer = np.empty_like(frame)
+    
+    # The legacy solutions reference read-only frames instead of copying
+    # them (mp.Image for the Tasks landmarkers copies either way), so the
+    # buffer is only writable while it is being refilled
+    buffer.flags.writeable = True
+    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buffer)
+    buffer.flags.writeable = False
+    return buffer
+
+def _create_landmarker(landmarker_class, options_class, model_path, **options):
+    """Create a MediaPipe Tasks landmarker in VIDEO mode, on the GPU when supported"""
+    for delegate in (mp_tasks.BaseOptions.Delegate.GPU, mp_tasks.BaseOptions.Delegate.CPU):
+        try:
+            return landmarker_class.create_from_options(options_class(
+                base_options=mp_tasks.BaseOptions(model_asset_path=model_path, delegate=delegate),
+                running_mode=vision.RunningMode.VIDEO,
+                **options
+            ))
+        except Exception as e:
+            print(f"Could not create {landmarker_class.__name__} with the {delegate.name} delegate: {str(e)}")
+    return None
+
+def _landmarks_array(landmarks):
+    """Copy one Tasks result's landmarks into an (N, 3) float32 array"""
+    return np.array([(lm.x, lm.y, lm.z) for lm in landmarks], dtype=np.float32)
+
+def _landmarks_to_np(landmarks, indices=None):
+    """Landmark coordinates as an (N, 3) float32 array, optionally only the given indices"""
+    # Tasks results are already arrays; the legacy solutions return a
+    # NormalizedLandmarkList, which is copied out here
+    if isinstance(landmarks, np.ndarray):
+        return landmarks if indices is None else landmarks[np.asarray(indices)]
+    landmark = landmarks.landmark
+    if indices is not None:
+        landmark = [landmark[i] for i in indices]
+    return np.array([(lm.x, lm.y, lm.z) for lm in landmark], dtype=np.float32)
+
+def _next_timestamp_ms(last_timestamp_ms):
+    """Next timestamp for a VIDEO mode landmarker, which needs them strictly increasing"""
+    return max(int(time.monotonic() * 1000), last_timestamp_ms + 1)
+
+class _TaskResults:
+    """Tasks API results in the shape of the legacy solution results, with (N, 3) landmark arrays"""
+    
+    def __init__(self, multi_hand_landmarks=None, multi_face_landmarks=None):
+        self.multi_hand_landmarks = multi_hand_landmarks
+        self.multi_face_landmarks = multi_face_landmarks
+
+class _DebouncedCounter:
+    """Counts a condition once it has held for duration_threshold seconds, at most once per cooldown_period"""
+    
+    def __init__(self, duration_threshold, cooldown_period):
+        self.duration_threshold = duration_threshold
+        self.cooldown_period = cooldown_period
+        self.reset()
+    
+    def reset(self):
+        self.count = 0
+        self.active = False
+        self.start_time = None
+        self.last_event_time = None
+    
+    def update(self, active, now):
+        """Feed the condition for this frame; returns True when a new event is counted"""
+        if not active:
+            self.active = False
+            self.start_time = None
+            return False
+        if not self.active:  # Condition just started
+            self.active = True
+            self.start_time = now
+            return False
+        
+        # Held long enough (start_time is cleared once counted) and out of cooldown
+        fired = (self.start_time is not None and
+                 now - self.start_time >= self.duration_threshold and
+                 (self.last_event_time is None or now - self.last_event_time >= self.cooldown_period))
+        if fired:
+            self.count += 1
+            self.last_event_time = now
+            self.start_time = None
+        return fired
 
 class HandGestureDetector:
     def __init__(self):
-        # Initialize MediaPipe Hands
+        # Initialize MediaPipe Hands. The Tasks hand landmarker (which can run
+        # on a GPU delegate) is used when its model file is present
         self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(
-            static_image_mode=False,
-            max_num_hands=2,
-            min_detection_confidence=0.7,
-            min_tracking_confidence=0.5
-        )
+        self.model_path = "hand_landmarker.task"
+        self.landmarker = None
+        self.hands = None
+        if os.path.exists(self.model_path):
+            self.landmarker = _create_landmarker(
+                vision.HandLandmarker, vision.HandLandmarkerOptions, self.model_path,
+                num_hands=2,
+                min_hand_detection_confidence=0.7,
+                min_tracking_confidence=0.5
+            )
+        if self.landmarker is None:
+            self.hands = self.mp_hands.Hands(
+                static_image_mode=False,
+                max_num_hands=2,
+                min_detection_confidence=0.7,
+                min_tracking_confidence=0.5
+            )
+        self._last_timestamp_ms = -1
         self.mp_draw = mp.solutions.drawing_utils
         
-        # Hand raise detection state
-        self.hand_raised = False
-        self.hand_raise_start_time = None
-        self.hand_raise_duration_threshold = 1.0  # seconds
-        self.hand_raise_count = 0
-        self.last_hand_raise_time = None
-        self.cooldown_period = 3.0  # seconds between hand raises
+        # Landmark indices and drawing styles, looked up once
+        self._wrist_idx = int(self.mp_hands.HandLandmark.WRIST)
+        self._middle_tip_idx = int(self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP)
+        self._hand_connections = np.array(sorted(self.mp_hands.HAND_CONNECTIONS), dtype=np.int32)
+        self._landmark_spec = self.mp_draw.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2)
+        self._connection_spec = self.mp_draw.DrawingSpec(color=(255, 0, 0), thickness=2)
+        
+        # Hand raise detection state: held for 1 s, 3 s between hand raises
+        self.hand_raise = _DebouncedCounter(duration_threshold=1.0, cooldown_period=3.0)
+        
+        # detect_hands downscales wider frames to this width before inference
+        self.inference_width = 640
+        self._rgb_buf = None
+        
+        # Hands are only run on every (hand_skip + 1)th frame; the frames in
+        # between reuse the last result (the 1 s raise threshold hides this)
+        self.hand_skip = 2
+        self._frame_idx = 0
+        self._last_result = None
     
     def detect_hands(self, frame):
         """Detect hands in frame"""
         # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        self._rgb_buf = bgr_to_rgb(frame, self._rgb_buf, self.inference_width)
+        return self.detect_hands_rgb(self._rgb_buf)
+    
+    def detect_hands_rgb(self, rgb_frame, mp_image=None):
+        """Detect hands in a frame that is already converted to RGB (pass it read-only so the legacy solution does not copy it)"""
+        skip = self._frame_idx % (self.hand_skip + 1) != 0
+        self._frame_idx += 1
+        if skip and self._last_result is not None:
+            return self._last_result
         
         # Process frame
-        results = self.hands.process(rgb_frame)
+        if self.landmarker is not None:
+            results = self._detect_with_landmarker(rgb_frame, mp_image)
+        else:
+            results = self.hands.process(rgb_frame)
         
         hand_data = {
             'hands_detected': False,
@@ -41,108 +177,176 @@ class HandGestureDetector:
             hand_data['hands_detected'] = True
             hand_data['hand_landmarks'] = results.multi_hand_landmarks
             
-            # Check if hand is raised
-            hand_data['hand_raised'] = self._is_hand_raised(results.multi_hand_landmarks[0])
+            # Check if any detected hand is raised
+            hand_points = np.stack([_landmarks_to_np(hand) for hand in results.multi_hand_landmarks])
+            hand_data['hand_raised'] = self._is_hand_raised(hand_points)
         
+        self._last_result = (hand_data, results)
         return hand_data, results
     
-    def _is_hand_raised(self, hand_landmarks):
-        """Check if hand is raised (above head level)"""
-        # Get wrist and middle finger tip positions
-        wrist = hand_landmarks.landmark[self.mp_hands.HandLandmark.WRIST]
-        middle_finger_tip = hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP]
+    def _detect_with_landmarker(self, rgb_frame, mp_image=None):
+        """Run the Tasks hand landmarker on an RGB frame"""
+        self._last_timestamp_ms = _next_timestamp_ms(self._last_timestamp_ms)
+        if mp_image is None:
+            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
+        result = self.landmarker.detect_for_video(mp_image, self._last_timestamp_ms)
+        
+        multi_hand_landmarks = None
+        if result.hand_landmarks:
+            multi_hand_landmarks = [_landmarks_array(landmarks) for landmarks in result.hand_landmarks]
+        return _TaskResults(multi_hand_landmarks=multi_hand_landmarks)
+    
+    def _is_hand_raised(self, hand_points):
+        """Check if any hand is raised (above head level), given an (N_hands, 21, 3) landmark array"""
+        # Get wrist and middle finger tip heights of every hand
+        wrist_y = hand_points[:, self._wrist_idx, 1]
+        middle_finger_tip_y = hand_points[:, self._middle_tip_idx, 1]
         
         # Hand is raised if wrist is significantly above middle finger
         # and hand is in upper portion of frame
-        hand_raised = (wrist.y < 0.4 and  # Hand in upper 40% of frame
-                      middle_finger_tip.y < wrist.y)  # Fingers pointing up
-        
-        return hand_raised
-    
-    def update_hand_raise_count(self, hand_raised):
-        """Update hand raise count with debouncing"""
-        current_time = datetime.now()
-        
-        if hand_raised:
-            if not self.hand_raised:  # New hand raise
-                self.hand_raised = True
-                self.hand_raise_start_time = current_time
-            elif self.hand_raise_start_time:
-                # Check if hand has been raised long enough
-                duration = (current_time - self.hand_raise_start_time).total_seconds()
-                
-                if duration >= self.hand_raise_duration_threshold:
-                    # Check cooldown period
-                    if (self.last_hand_raise_time is None or 
-                        (current_time - self.last_hand_raise_time).total_seconds() >= self.cooldown_period):
-                        self.hand_raise_count += 1
-                        self.last_hand_raise_time = current_time
-                        self.hand_raise_start_time = None  # Reset
-                        return True  # New hand raise detected
-        else:
-            self.hand_raised = False
-            self.hand_raise_start_time = None
+        hand_raised = ((wrist_y < 0.4) &  # Hand in upper 40% of frame
+                       (middle_finger_tip_y < wrist_y))  # Fingers pointing up
         
-        return False
+        return bool(hand_raised.any())
+    
+    def update_hand_raise_count(self, hand_raised, now=None):
+        """Update hand raise count with debouncing (now is a time.monotonic() reading)"""
+        return self.hand_raise.update(hand_raised, time.monotonic() if now is None else now)
     
     def draw_hand_landmarks(self, frame, results):
         """Draw hand landmarks on frame"""
         if results.multi_hand_landmarks:
+            h, w = frame.shape[:2]
+            landmark_spec = self._landmark_spec
+            border_radius = max(landmark_spec.circle_radius + 1, int(landmark_spec.circle_radius * 1.2))
+            
             for hand_landmarks in results.multi_hand_landmarks:
-                self.mp_draw.draw_landmarks(
-                    frame,
-                    hand_landmarks,
-                    self.mp_hands.HAND_CONNECTIONS,
-                    self.mp_draw.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
-                    self.mp_draw.DrawingSpec(color=(255, 0, 0), thickness=2)
-                )
+                # Pixel positions, skipping landmarks outside the frame
+                # (same rules as mp.solutions.drawing_utils)
+                points = _landmarks_to_np(hand_landmarks)[:, :2]
+                visible = np.all((points >= 0) & (points <= 1), axis=1)
+                pixels = np.minimum(np.floor(points * (w, h)), (w - 1, h - 1)).astype(np.int32)
+                
+                # All connections in one native call
+                connections = self._hand_connections
+                connections = connections[visible[connections[:, 0]] & visible[connections[:, 1]]]
+                cv2.polylines(frame, pixels[connections], False,
+                              self._connection_spec.color, self._connection_spec.thickness)
+                
+                # Landmarks: white border, then the landmark colour
+                for x, y in pixels[visible].tolist():
+                    cv2.circle(frame, (x, y), border_radius, (224, 224, 224), landmark_spec.thickness)
+                    cv2.circle(frame, (x, y), landmark_spec.circle_radius, landmark_spec.color, landmark_spec.thickness)
         return frame
     
     def get_hand_raise_count(self):
         """Get total hand raise count"""
-        return self.hand_raise_count
+        return self.hand_raise.count
     
     def reset_count(self):
         """Reset hand raise count"""
-        self.hand_raise_count = 0
-        self.hand_raised = False
-        self.hand_raise_start_time = None
-        self.last_hand_raise_time = None
+        self.hand_raise.reset()
+        self._last_result = None
     
     def release(self):
         """Release resources"""
-        self.hands.close()
+        if self.landmarker is not None:
+            self.landmarker.close()
+        if self.hands is not None:
+            self.hands.close()
 
 
 class FaceMovementDetector:
     def __init__(self):
         # Initialize MediaPipe Face Mesh
+        # (no iris/lip refinement: head pose only needs the base 468-point
+        # mesh, and the contour drawing does not use the refined points).
+        # The Tasks face landmarker is used when its model file is present
         self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
+        self.model_path = "face_landmarker.task"
+        self.landmarker = None
+        self.face_mesh = None
+        if os.path.exists(self.model_path):
+            self.landmarker = _create_landmarker(
+                vision.FaceLandmarker, vision.FaceLandmarkerOptions, self.model_path,
+                num_faces=1,
+                min_face_detection_confidence=0.5,
+                min_tracking_confidence=0.5
+            )
+        if self.landmarker is None:
+            # Video (tracking) mode: while a face is tracked, the mesh model
+            # runs on a crop derived from the previous frame's landmarks and
+            # the full-frame detector only runs when tracking is lost
+            self.face_mesh = self.mp_face_mesh.FaceMesh(
+                static_image_mode=False,
+                max_num_faces=1,
+                refine_landmarks=False,
+                min_detection_confidence=0.5,
+                min_tracking_confidence=0.5
+            )
+        self._last_timestamp_ms = -1
         self.mp_draw = mp.solutions.drawing_utils
         self.drawing_spec = self.mp_draw.DrawingSpec(thickness=1, circle_radius=1)
         
-        # Attention tracking
-        self.looking_away_count = 0
-        self.is_looking_away = False
-        self.looking_away_start_time = None
-        self.looking_away_threshold = 2.0  # seconds
-        self.last_looking_away_time = None
-        self.cooldown_period = 5.0  # seconds
+        # Attention tracking: away for 2 s, 5 s between counts
+        self.looking_away = _DebouncedCounter(duration_threshold=2.0, cooldown_period=5.0)
         
         # Head pose thresholds
         self.yaw_threshold = 20  # degrees
         self.pitch_threshold = 15  # degrees
+        
+        # Landmarks used for head pose: nose, chin, left eye, right eye,
+        # left mouth, right mouth
+        self._pose_idx = (1, 152, 33, 263, 61, 291)
+        
+        # Matching 3D model points (approximate)
+        self._model_points = np.array([
+            (0.0, 0.0, 0.0),             # Nose tip
+            (0.0, -330.0, -65.0),        # Chin
+            (-225.0, 170.0, -135.0),     # Left eye left corner
+            (225.0, 170.0, -135.0),      # Right eye right corner
+            (-150.0, -150.0, -125.0),    # Left Mouth corner
+            (150.0, -150.0, -125.0)      # Right mouth corner
+        ], dtype=np.float64)
+        
+        # Distortion coefficients (assuming no distortion)
+        self._dist_coeffs = np.zeros((4, 1), dtype=np.float64)
+        
+        # Camera matrix, rebuilt only when the frame size changes
+        self._camera_matrix = None
+        self._cm_shape = None
+        
+        # Mesh drawing: contour segments are recomputed every draw_interval
+        # frames and the cached segments are redrawn in between
+        self.draw_interval = 3
+        self._draw_count = 0
+        self._mesh_segments = None
+        
+        # Contour edges as an (E, 2) index array into just the landmarks
+        # they touch, so only those are read out of the mesh
+        contour_edges = np.array(sorted(self.mp_face_mesh.FACEMESH_CONTOURS), dtype=np.int32)
+        self._contour_idx, self._contour_edges = np.unique(contour_edges, return_inverse=True)
+        self._contour_edges = self._contour_edges.reshape(contour_edges.shape)
+        
+        # Previous pose, used to warm-start solvePnP while the face is tracked
+        self._prev_rvec = None
+        self._prev_tvec = None
+        
+        # detect_face_movement downscales wider frames to this width before inference
+        self.inference_width = 640
+        self._rgb_buf = None
     
     def detect_face_movement(self, frame):
         """Detect face and head pose"""
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(rgb_frame)
+        self._rgb_buf = bgr_to_rgb(frame, self._rgb_buf, self.inference_width)
+        return self.detect_face_movement_rgb(self._rgb_buf)
+    
+    def detect_face_movement_rgb(self, rgb_frame, mp_image=None):
+        """Detect face and head pose in a frame that is already converted to RGB"""
+        if self.landmarker is not None:
+            results = self._detect_with_landmarker(rgb_frame, mp_image)
+        else:
+            results = self.face_mesh.process(rgb_frame)
         
         face_data = {
             'face_detected': False,
@@ -156,7 +360,7 @@ class FaceMovementDetector:
             face_landmarks = results.multi_face_landmarks[0]
             
             # Calculate head pose
-            head_pose = self._calculate_head_pose(face_landmarks, frame.shape)
+            head_pose = self._calculate_head_pose(face_landmarks, rgb_frame.shape)
             face_data['head_pose'] = head_pose
             
             # Determine if looking away
@@ -170,72 +374,81 @@ class FaceMovementDetector:
                 yaw_score = max(0, 100 - abs(yaw) * 2)
                 pitch_score = max(0, 100 - abs(pitch) * 3)
                 face_data['attention_score'] = (yaw_score + pitch_score) / 2
+        else:
+            # Face lost: the next one starts from a cold pose estimate
+            self._prev_rvec = None
+            self._prev_tvec = None
         
         return face_data, results
     
+    def _detect_with_landmarker(self, rgb_frame, mp_image=None):
+        """Run the Tasks face landmarker on an RGB frame"""
+        self._last_timestamp_ms = _next_timestamp_ms(self._last_timestamp_ms)
+        if mp_image is None:
+            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
+        result = self.landmarker.detect_for_video(mp_image, self._last_timestamp_ms)
+        
+        multi_face_landmarks = None
+        if result.face_landmarks:
+            multi_face_landmarks = [_landmarks_array(landmarks) for landmarks in result.face_landmarks]
+        return _TaskResults(multi_face_landmarks=multi_face_landmarks)
+    
     def _calculate_head_pose(self, face_landmarks, image_shape):
         """Calculate head pose angles (yaw, pitch, roll)"""
         h, w = image_shape[:2]
         
-        # Key facial landmarks for head pose estimation
-        # Nose tip, chin, left eye, right eye, left mouth, right mouth
-        landmarks_2d = []
-        landmarks_3d = []
-        
-        # Define 3D model points (approximate)
-        model_points = np.array([
-            (0.0, 0.0, 0.0),             # Nose tip
-            (0.0, -330.0, -65.0),        # Chin
-            (-225.0, 170.0, -135.0),     # Left eye left corner
-            (225.0, 170.0, -135.0),      # Right eye right corner
-            (-150.0, -150.0, -125.0),    # Left Mouth corner
-            (150.0, -150.0, -125.0)      # Right mouth corner
-        ], dtype=np.float64)
-        
-        # Get corresponding 2D points
-        landmark_indices = [1, 152, 33, 263, 61, 291]  # Nose, Chin, Left eye, Right eye, Left mouth, Right mouth
-        
-        for idx in landmark_indices:
-            landmark = face_landmarks.landmark[idx]
-            x = int(landmark.x * w)
-            y = int(landmark.y * h)
-            landmarks_2d.append([x, y])
-            landmarks_3d.append([landmark.x * w, landmark.y * h, landmark.z * w])
-        
-        landmarks_2d = np.array(landmarks_2d, dtype=np.float64)
+        # Gather the corresponding 2D points and scale them to whole pixels
+        points = _landmarks_to_np(face_landmarks, self._pose_idx)
+        landmarks_2d = np.trunc(points[:, :2].astype(np.float64) * (w, h))
         
         # Camera matrix
-        focal_length = w
-        center = (w / 2, h / 2)
-        camera_matrix = np.array([
-            [focal_length, 0, center[0]],
-            [0, focal_length, center[1]],
-            [0, 0, 1]
-        ], dtype=np.float64)
-        
-        # Distortion coefficients (assuming no distortion)
-        dist_coeffs = np.zeros((4, 1))
+        if self._cm_shape != (h, w):
+            focal_length = w
+            center = (w / 2, h / 2)
+            self._camera_matrix = np.array([
+                [focal_length, 0, center[0]],
+                [0, focal_length, center[1]],
+                [0, 0, 1]
+            ], dtype=np.float64)
+            self._cm_shape = (h, w)
+            self._prev_rvec = None
+            self._prev_tvec = None
         
-        # Solve PnP
-        success, rotation_vector, translation_vector = cv2.solvePnP(
-            model_points,
-            landmarks_2d,
-            camera_matrix,
-            dist_coeffs,
-            flags=cv2.SOLVEPNP_ITERATIVE
-        )
+        # Solve PnP, starting from the previous frame's pose when there is one
+        if self._prev_rvec is None:
+            success, rotation_vector, translation_vector = cv2.solvePnP(
+                self._model_points,
+                landmarks_2d,
+                self._camera_matrix,
+                self._dist_coeffs,
+                flags=cv2.SOLVEPNP_ITERATIVE
+            )
+        else:
+            success, rotation_vector, translation_vector = cv2.solvePnP(
+                self._model_points,
+                landmarks_2d,
+                self._camera_matrix,
+                self._dist_coeffs,
+                rvec=self._prev_rvec,
+                tvec=self._prev_tvec,
+                useExtrinsicGuess=True,
+                flags=cv2.SOLVEPNP_ITERATIVE
+            )
         
         if success:
+            # Remember the pose for the next frame's warm start
+            self._prev_rvec = rotation_vector
+            self._prev_tvec = translation_vector
+            
             # Convert rotation vector to rotation matrix
             rotation_matrix, _ = cv2.Rodrigues(rotation_vector)
             
-            # Calculate Euler angles
-            pose_mat = cv2.hconcat((rotation_matrix, translation_vector))
-            _, _, _, _, _, _, euler_angles = cv2.decomposeProjectionMatrix(pose_mat)
-            
-            pitch = euler_angles[0][0]
-            yaw = euler_angles[1][0]
-            roll = euler_angles[2][0]
+            # Calculate Euler angles directly from the rotation matrix
+            # (same convention as cv2.decomposeProjectionMatrix)
+            r = rotation_matrix
+            pitch = math.degrees(math.atan2(r[2, 1], r[2, 2]))
+            yaw = math.degrees(math.atan2(-r[2, 0], math.hypot(r[2, 1], r[2, 2])))
+            roll = math.degrees(math.atan2(r[1, 0], r[0, 0]))
             
             return {
                 'pitch': pitch,
@@ -243,61 +456,181 @@ class FaceMovementDetector:
                 'roll': roll
             }
         
+        self._prev_rvec = None
+        self._prev_tvec = None
         return None
     
-    def update_looking_away_count(self, looking_away):
-        """Update looking away count with debouncing"""
-        current_time = datetime.now()
-        
-        if looking_away:
-            if not self.is_looking_away:
-                self.is_looking_away = True
-                self.looking_away_start_time = current_time
-            elif self.looking_away_start_time:
-                duration = (current_time - self.looking_away_start_time).total_seconds()
-                
-                if duration >= self.looking_away_threshold:
-                    if (self.last_looking_away_time is None or
-                        (current_time - self.last_looking_away_time).total_seconds() >= self.cooldown_period):
-                        self.looking_away_count += 1
-                        self.last_looking_away_time = current_time
-                        self.looking_away_start_time = None
-                        return True
-        else:
-            self.is_looking_away = False
-            self.looking_away_start_time = None
-        
-        return False
+    def update_looking_away_count(self, looking_away, now=None):
+        """Update looking away count with debouncing (now is a time.monotonic() reading)"""
+        return self.looking_away.update(looking_away, time.monotonic() if now is None else now)
     
     def draw_face_mesh(self, frame, results):
-        """Draw face mesh on frame"""
-        if results.multi_face_landmarks:
-            for face_landmarks in results.multi_face_landmarks:
-                self.mp_draw.draw_landmarks(
-                    image=frame,
-                    landmark_list=face_landmarks,
-                    connections=self.mp_face_mesh.FACEMESH_TESSELATION,
-                    landmark_drawing_spec=None,
-                    connection_drawing_spec=self.mp_draw.DrawingSpec(
-                        color=(0, 255, 0), thickness=1
-                    )
-                )
+        """Draw face mesh contours on frame"""
+        if self._draw_count % self.draw_interval == 0:
+            self._mesh_segments = None
+            if results.multi_face_landmarks:
+                h, w = frame.shape[:2]
+                segments = []
+                for face_landmarks in results.multi_face_landmarks:
+                    points = _landmarks_to_np(face_landmarks, self._contour_idx)[:, :2]
+                    points = (points.astype(np.float64) * (w, h)).astype(np.int32)
+                    segments.append(points[self._contour_edges])
+                self._mesh_segments = np.concatenate(segments)
+        self._draw_count += 1
+        
+        # One native call draws every segment
+        if self._mesh_segments is not None:
+            cv2.polylines(frame, self._mesh_segments, False, (0, 255, 0), 1)
         return frame
     
     def get_looking_away_count(self):
         """Get total looking away count"""
-        return self.looking_away_count
+        return self.looking_away.count
     
     def reset_count(self):
         """Reset looking away count"""
-        self.looking_away_count = 0
-        self.is_looking_away = False
-        self.looking_away_start_time = None
-        self.last_looking_away_time = None
+        self.looking_away.reset()
     
     def release(self):
         """Release resources"""
-        self.face_mesh.close()
+        if self.landmarker is not None:
+            self.landmarker.close()
+        if self.face_mesh is not None:
+            self.face_mesh.close()
+
+def detect_hands_and_face(hand_detector, face_detector, rgb_frame, executor):
+    """Run hand and face mesh detection concurrently on one shared RGB frame"""
+    # The two graphs are independent and release the GIL during inference,
+    # so the hand graph runs on the executor while the face mesh runs here
+    mp_image = None
+    if hand_detector.landmarker is not None or face_detector.landmarker is not None:
+        # mp.Image copies the pixels even from a read-only array, so wrap the
+        # frame once for both landmarkers
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
+    
+    hands_future = executor.submit(hand_detector.detect_hands_rgb, rgb_frame, mp_image)
+    face_data, face_results = face_detector.detect_face_movement_rgb(rgb_frame, mp_image)
+    hand_data, hand_results = hands_future.result()
+    
+    return hand_data, hand_results, face_data, face_results
+
+class PipelineRunner:
+    """Capture -> inference -> display pipeline around the two detectors"""
+    
+    def __init__(self, hand_detector, face_detector, camera_index=0, queue_size=2,
+                 inference_width=640):
+        self.hand_detector = hand_detector
+        self.face_detector = face_detector
+        self.camera_index = camera_index
+        self.inference_width = inference_width
+        
+        # Small bounded queues keep latency low; when a stage falls behind,
+        # the oldest frame is dropped in favour of the newest
+        self.frames_in = queue.Queue(maxsize=queue_size)
+        self.results_out = queue.Queue(maxsize=queue_size)
+        self.running = False
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._rgb_buf = None
+    
+    def run(self):
+        """Run until 'q' is pressed or the camera stops delivering frames"""
+        cap = cv2.VideoCapture(self.camera_index)
+        if not cap.isOpened():
+            print("Error: Could not open camera")
+            return
+        
+        self.running = True
+        threads = [
+            threading.Thread(target=self._capture_loop, args=(cap,), daemon=True),
+            threading.Thread(target=self._inference_loop, daemon=True)
+        ]
+        for thread in threads:
+            thread.start()
+        
+        # Display stays on the calling thread, as HighGUI expects
+        try:
+            self._display_loop()
+        finally:
+            self.running = False
+            for thread in threads:
+                thread.join()
+            cap.release()
+            cv2.destroyAllWindows()
+            self._executor.shutdown()
+    
+    def _capture_loop(self, cap):
+        """Stage 1: read camera frames"""
+        while self.running:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            self._put_latest(self.frames_in, frame)
+        self._put_latest(self.frames_in, None)
+    
+    def _inference_loop(self):
+        """Stage 2: run both detectors on each frame"""
+        while self.running:
+            try:
+                frame = self.frames_in.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if frame is None:
+                break
+            
+            self._rgb_buf = bgr_to_rgb(frame, self._rgb_buf, self.inference_width)
+            hand_data, hand_results, face_data, face_results = detect_hands_and_face(
+                self.hand_detector, self.face_detector, self._rgb_buf, self._executor
+            )
+            now = time.monotonic()
+            self.hand_detector.update_hand_raise_count(hand_data['hand_raised'], now)
+            self.face_detector.update_looking_away_count(face_data['looking_away'], now)
+            
+            self._put_latest(self.results_out, (frame, hand_results, face_results))
+        self._put_latest(self.results_out, None)
+    
+    def _display_loop(self):
+        """Stage 3: draw the results and show them"""
+        while self.running:
+            try:
+                item = self.results_out.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            
+            frame, hand_results, face_results = item
+            frame = self.face_detector.draw_face_mesh(frame, face_results)
+            frame = self.hand_detector.draw_hand_landmarks(frame, hand_results)
+            cv2.putText(frame, f"Hand raises: {self.hand_detector.get_hand_raise_count()}", (10, 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            cv2.putText(frame, f"Looking away: {self.face_detector.get_looking_away_count()}", (10, 60),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            
+            cv2.imshow('Gesture Detection', frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    
+    @staticmethod
+    def _put_latest(q, item):
+        """Put an item, dropping the oldest queued item if the queue is full"""
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
 
 if __name__ == "__main__":
-    print("Hand and Face Movement Detector initialized")
\ No newline at end of file
+    hand_detector = HandGestureDetector()
+    face_detector = FaceMovementDetector()
+    print("Hand and Face Movement Detector initialized")
+    print("Press 'q' to quit")
+    
+    try:
+        PipelineRunner(hand_detector, face_detector).run()
+    finally:
+        hand_detector.release()
+        face_detector.release()
\ No newline at end of file
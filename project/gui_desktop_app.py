@@ -4,37 +4,123 @@ Student Behavior Tracking System - Desktop GUI Application
 Modern graphical interface using Tkinter
 """
 
+import argparse
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import cv2
 from PIL import Image, ImageTk
 import threading
+import queue
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from database import DatabaseManager
-from face_recognition_module import FaceRecognitionSystem
-from gesture_detection import HandGestureDetector, FaceMovementDetector
+from session_students import SessionStudents
 import numpy as np
 
 class BehaviorTrackingGUI:
-    def __init__(self, root):
+    def __init__(self, root, use_opencl=False):
         self.root = root
         self.root.title("Student Behavior Tracking System")
         self.root.geometry("1400x900")
         self.root.configure(bg='#2C3E50')
         
-        # Initialize systems
+        # Initialize systems. Importing face_recognition (dlib models) and
+        # MediaPipe takes seconds, so both modules are imported and their
+        # models built on a loader thread on first use (ensure_detectors)
+        # rather than before the window is shown
         self.db = DatabaseManager()
-        self.face_system = FaceRecognitionSystem()
-        self.hand_detector = HandGestureDetector()
-        self.face_detector = FaceMovementDetector()
+        self.face_system = None
+        self.hand_detector = None
+        self.face_detector = None
+        self.detect_hands_and_face = None
+        self.bgr_to_rgb = None
+        self.loader_thread = None
+        self.loader_error = None
+        self._loader_status = ""
+        self.detector_pool = ThreadPoolExecutor(max_workers=1)
+        self.rgb_buffer = None
+        
+        # Width of the downscaled frame fed to the detectors; the full frame
+        # is only used for drawing and display
+        self.inference_width = 320
+        
+        # Identities change slowly, so face recognition runs every N frames
+        # and its result is reused in between (hands run on every 2nd frame,
+        # see _load_gesture_detectors; the face mesh runs every frame)
+        self.recognition_interval = 15
+        self.frame_count = 0
+        self.last_recognized_students = []
+        
+        # The camera delivers ~30 FPS; only every process_every-th frame is
+        # decoded and processed, the others are grabbed and dropped
+        self.target_fps = 15
+        self.process_every = max(1, int(30 / self.target_fps))
+        
+        # Capture -> inference -> display stages, joined by one-slot queues
+        # that always hold the newest frame (older ones are dropped)
+        self.capture_q = queue.Queue(maxsize=1)
+        self.display_q = queue.Queue(maxsize=1)
+        self.capture_thread = None
+        self.inference_thread = None
+        self.pump_after_id = None
+        self.video_photo = None
+        self.display_buffer = None
+        
+        # Optionally run the display resize/conversion through OpenCL. Off by
+        # default (main() turns it on with --opencl) and only used on an
+        # NVIDIA or AMD device: on integrated GPUs
+        # the upload and download cost more than resizing on the CPU.
+        # Overlays are still drawn on the CPU frame: a kernel launch per line
+        # or circle costs more than drawing it in place
+        self.use_opencl = use_opencl and self._discrete_opencl_device()
+        
+        # Statistics are refreshed at a fixed 2 Hz, independent of FPS
+        self.stats_interval_ms = 500
+        self.stats_after_id = None
+        
+        # Completion times of the last processed frames, for the FPS readout
+        self.frame_times = deque(maxlen=60)
+        
+        # Text last written to each statistics widget (see _set_text)
+        self._shown_texts = {}
+        
+        # Camera being opened in the background (see start_monitoring)
+        self.camera_thread = None
+        self.opened_cap = None
+        
+        # Face recognition test preview (see test_recognition)
+        self.test_running = False
+        self.test_cap = None
+        self.test_window = None
+        self.test_photo = None
+        self.test_after_id = None
         
         # Monitoring state
         self.is_monitoring = False
         self.cap = None
         self.session_start_time = None
-        self.active_students = {}
         self.attendance_marked = set()
         
+        # Per-student session data as parallel arrays. The inference thread
+        # adds rows while the Tk thread reads rows [0, len(students))
+        self.students = SessionStudents()
+        
+        # Registered students, re-read only after students_version is bumped
+        # (RegisterWindow does that when it adds a student)
+        self.students_version = 0
+        self._cached_students = lru_cache(maxsize=1)(
+            lambda version: tuple(self.db.get_all_students())
+        )
+        
+        # Database writes are handed to a background thread so disk I/O
+        # never stalls the inference loop
+        self._db_queue = queue.Queue()
+        self._db_thread = threading.Thread(target=self._db_worker, daemon=True)
+        self._db_thread.start()
+        
         # Create GUI
         self.create_header()
         self.create_main_content()
@@ -253,11 +339,18 @@ class BehaviorTrackingGUI:
             relief=tk.SUNKEN
         )
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        
+        # Flush queued database writes when the window is closed
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
     
     def start_monitoring(self):
         """Start monitoring session"""
+        # The test preview holds the camera
+        if self.test_running:
+            self.close_test()
+        
         # Check if students are registered
-        students = self.db.get_all_students()
+        students = self.get_students()
         if not students:
             messagebox.showwarning(
                 "No Students",
@@ -265,16 +358,55 @@ class BehaviorTrackingGUI:
             )
             return
         
-        # Initialize camera
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
+        # Loads the models first if needed, then calls start_monitoring again
+        if not self.ensure_detectors(self.start_monitoring):
+            return
+        
+        if self.camera_thread is not None:
+            return  # Camera is already being opened
+        
+        # Opening a camera can take a second or more, so it is done on a
+        # thread while the window stays responsive
+        self.start_btn.config(state=tk.DISABLED)
+        self.status_bar.config(text="Starting... | Camera: Connecting")
+        self.opened_cap = None
+        self.camera_thread = threading.Thread(target=self.open_camera, daemon=True)
+        self.camera_thread.start()
+        self.root.after(50, self.check_camera)
+    
+    def open_camera(self):
+        """Open and warm up the camera (camera thread)"""
+        cap = cv2.VideoCapture(0)
+        if cap.isOpened():
+            # Keep the driver queue short and let the camera send MJPEG, which
+            # is cheaper to decode than raw YUV at the same resolution
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+            cap.read()  # The first read is slow on many drivers
+        self.opened_cap = cap
+    
+    def check_camera(self):
+        """Start the session once the camera thread is done (Tk main thread)"""
+        if self.camera_thread.is_alive():
+            self.root.after(50, self.check_camera)
+            return
+        self.camera_thread = None
+        
+        cap, self.opened_cap = self.opened_cap, None
+        if not cap.isOpened():
+            cap.release()
+            self.start_btn.config(state=tk.NORMAL)
+            self.status_bar.config(text="Ready | Camera: Not Connected")
             messagebox.showerror("Camera Error", "Could not open camera!")
             return
         
+        self.cap = cap
         self.is_monitoring = True
         self.session_start_time = datetime.now()
-        self.active_students = {}
+        self.students = SessionStudents()
         self.attendance_marked = set()
+        self.frame_count = 0
+        self.last_recognized_students = []
         
         # Update buttons
         self.start_btn.config(state=tk.DISABLED)
@@ -283,9 +415,23 @@ class BehaviorTrackingGUI:
         # Update status
         self.status_bar.config(text="Monitoring Active | Camera: Connected")
         
-        # Start monitoring thread
-        self.monitoring_thread = threading.Thread(target=self.monitoring_loop, daemon=True)
-        self.monitoring_thread.start()
+        # Start capture and inference threads; frames are shown from the Tk
+        # main thread, since Tk must not be touched from the workers
+        self.capture_q = queue.Queue(maxsize=1)
+        self.display_q = queue.Queue(maxsize=1)
+        self.frame_times.clear()
+        self.capture_thread = threading.Thread(target=self.capture_loop, daemon=True)
+        self.inference_thread = threading.Thread(target=self.inference_loop, daemon=True)
+        self.capture_thread.start()
+        self.inference_thread.start()
+        
+        # One PhotoImage is shown for the whole session and refilled with
+        # paste() each frame (Tk holds no Python reference to it, so keep
+        # one here or it is garbage collected and the label blanks)
+        self.video_photo = ImageTk.PhotoImage(Image.new('RGB', (800, 600)))
+        self.video_label.configure(image=self.video_photo)
+        self.pump_after_id = self.root.after(15, self.pump_display)
+        self.stats_after_id = self.root.after(self.stats_interval_ms, self.stats_tick)
         
         messagebox.showinfo("Monitoring Started", "Behavior monitoring session has started!")
     
@@ -293,6 +439,21 @@ class BehaviorTrackingGUI:
         """Stop monitoring session"""
         self.is_monitoring = False
         
+        # Stop the display pump so no frame is drawn after the label is
+        # cleared, and the statistics timer
+        if self.pump_after_id is not None:
+            self.root.after_cancel(self.pump_after_id)
+            self.pump_after_id = None
+        if self.stats_after_id is not None:
+            self.root.after_cancel(self.stats_after_id)
+            self.stats_after_id = None
+        
+        # Let the workers finish their current frame before the camera is
+        # released and the session is saved
+        for thread in (self.capture_thread, self.inference_thread):
+            if thread is not None:
+                thread.join(timeout=2.0)
+        
         if self.cap:
             self.cap.release()
         
@@ -311,97 +472,178 @@ class BehaviorTrackingGUI:
         
         messagebox.showinfo("Monitoring Stopped", "Session ended. Report saved!")
     
-    def monitoring_loop(self):
-        """Main monitoring loop"""
-        frame_count = 0
-        
+    def capture_loop(self):
+        """Read camera frames into capture_q (capture thread)"""
         while self.is_monitoring:
-            ret, frame = self.cap.read()
+            # grab() skips frames without decoding them; only the last one
+            # of each batch is retrieved
+            if not all(self.cap.grab() for _ in range(self.process_every)):
+                break
+            ret, frame = self.cap.retrieve()
             if not ret:
                 break
             
-            frame_count += 1
-            
-            # Process frame
-            processed_frame = self.process_frame(frame)
-            
-            # Convert to PhotoImage
-            cv2image = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(cv2image)
-            img = img.resize((800, 600), Image.LANCZOS)
-            imgtk = ImageTk.PhotoImage(image=img)
+            self._put_latest(self.capture_q, frame)
+        
+        # Tell the inference thread to stop
+        self._put_latest(self.capture_q, None)
+    
+    def inference_loop(self):
+        """Process frames from capture_q into display_q (inference thread)"""
+        # Build the OpenCL kernels here rather than on the first pump_display,
+        # where compiling them would stall the Tk thread
+        if self.use_opencl:
+            self._warm_up_opencl()
+        
+        while True:
+            frame = self.capture_q.get()
+            if frame is None:
+                break
             
-            # Update video label
-            self.video_label.imgtk = imgtk
-            self.video_label.configure(image=imgtk)
+            self._put_latest(self.display_q, self.process_frame(frame))
+            self.frame_times.append(time.perf_counter())
+    
+    @staticmethod
+    def _discrete_opencl_device():
+        """Whether OpenCL's default device is an NVIDIA or AMD GPU"""
+        if not cv2.ocl.haveOpenCL():
+            return False
+        device = cv2.ocl.Device.getDefault()
+        return device.isNVidia() or device.isAMD()
+    
+    def _warm_up_opencl(self):
+        """Run the display resize/conversion once so OpenCL compiles its kernels"""
+        frame = cv2.UMat(np.zeros((480, 640, 3), dtype=np.uint8))
+        frame = cv2.resize(frame, (800, 600), interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB).get()
+    
+    def pump_display(self):
+        """Show the newest processed frame (runs on the Tk main thread)"""
+        self.pump_after_id = None
+        if not self.is_monitoring:
+            return
+        
+        try:
+            processed_frame = self.display_q.get_nowait()
+        except queue.Empty:
+            processed_frame = None
+        
+        if processed_frame is not None:
+            # Copy into the label's PhotoImage. OpenCV's bilinear resize is
+            # several times faster than PIL's LANCZOS; resizing first keeps
+            # the colour conversion at display size even for HD cameras. Both
+            # steps write into one reused buffer (BGR->RGB works in place)
+            if self.use_opencl:
+                # T-API: one upload, resize and convert on the OpenCL device,
+                # one download of the display-sized result
+                display_frame = cv2.resize(cv2.UMat(processed_frame), (800, 600),
+                                           interpolation=cv2.INTER_LINEAR)
+                self.display_buffer = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB).get()
+            else:
+                self.display_buffer = cv2.resize(processed_frame, (800, 600), dst=self.display_buffer,
+                                                 interpolation=cv2.INTER_LINEAR)
+                cv2.cvtColor(self.display_buffer, cv2.COLOR_BGR2RGB, dst=self.display_buffer)
             
-            # Update statistics
-            if frame_count % 10 == 0:  # Update every 10 frames
-                self.update_statistics()
+            # ImageTk's paste() hands the pixels to Tk_PhotoPutBlock directly.
+            # Encoding for PhotoImage(data=...) instead would add an encode
+            # here and a decode in Tk (and Tk cannot read JPEG at all)
+            self.video_photo.paste(Image.fromarray(self.display_buffer))
         
+        self.pump_after_id = self.root.after(15, self.pump_display)
+    
+    def stats_tick(self):
+        """Refresh the statistics panel, then reschedule (Tk main thread)"""
+        self.stats_after_id = None
+        if not self.is_monitoring:
+            return
+        
+        self.update_statistics()
+        self.stats_after_id = self.root.after(self.stats_interval_ms, self.stats_tick)
+    
+    @staticmethod
+    def _put_latest(q, item):
+        """Put an item, dropping the oldest queued item if the queue is full"""
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+    
     def process_frame(self, frame):
         """Process video frame"""
         current_time = datetime.now()
         current_date = current_time.date().isoformat()
-        
-        # 1. Face Recognition
-        recognized_students = self.face_system.recognize_faces(frame)
+        now = time.monotonic()  # for the gesture debounce timers
+        
+        # Downscale and convert once, and share the (read-only) small RGB frame
+        # between all detectors (landmarks are normalized, boxes are scaled back up)
+        self.rgb_buffer = self.bgr_to_rgb(frame, self.rgb_buffer, self.inference_width)
+        rgb_frame = self.rgb_buffer
+        scale = rgb_frame.shape[1] / frame.shape[1]
+        
+        # 1. Face Recognition (every N frames, reuse last result otherwise)
+        if self.frame_count % self.recognition_interval == 0:
+            self.last_recognized_students = self.face_system.recognize_faces_rgb(rgb_frame, scale)
+        self.frame_count += 1
+        recognized_students = self.last_recognized_students
         frame = self.face_system.draw_face_boxes(frame, recognized_students)
         
         # Update active students
+        timestamp = current_time.timestamp()
+        students = self.students
         for student in recognized_students:
             if student['student_id']:
                 student_id = student['student_id']
                 
-                if student_id not in self.active_students:
-                    self.active_students[student_id] = {
-                        'name': student['name'],
-                        'first_seen': current_time,
-                        'last_seen': current_time,
-                        'hand_raises': 0,
-                        'looking_away_count': 0,
-                        'attention_scores': [],
-                        'total_frames': 0
-                    }
+                row = students.student_index.get(student_id)
+                if row is None:
+                    row = students.add(student_id, student['name'], timestamp)
                 
-                self.active_students[student_id]['last_seen'] = current_time
-                self.active_students[student_id]['total_frames'] += 1
+                students.last_seen[row] = timestamp
+                students.total_frames_seen[row] += 1
                 
                 # Mark attendance
                 if student_id not in self.attendance_marked:
                     time_in = current_time.strftime("%H:%M:%S")
-                    self.db.mark_attendance(student_id, current_date, time_in)
+                    self._db_queue.put(('attendance', (student_id, current_date, time_in)))
                     self.attendance_marked.add(student_id)
         
+        # Rows [0, active_count) hold the students seen so far this session
+        active_count = len(students)
+        
+        # 2 & 3. Hand and face movement detection, run concurrently
+        hand_data, hand_results, face_data, _ = self.detect_hands_and_face(
+            self.hand_detector, self.face_detector, rgb_frame, self.detector_pool
+        )
+        
         # 2. Hand Detection
-        hand_data, hand_results = self.hand_detector.detect_hands(frame)
         if hand_data['hands_detected']:
             frame = self.hand_detector.draw_hand_landmarks(frame, hand_results)
             
             if hand_data['hand_raised']:
-                new_raise = self.hand_detector.update_hand_raise_count(True)
+                new_raise = self.hand_detector.update_hand_raise_count(True, now)
                 if new_raise:
-                    for student_id in self.active_students.keys():
-                        self.active_students[student_id]['hand_raises'] += 1
+                    students.hand_raises[:active_count] += 1
             else:
-                self.hand_detector.update_hand_raise_count(False)
+                self.hand_detector.update_hand_raise_count(False, now)
         
         # 3. Face Movement
-        face_data, _ = self.face_detector.detect_face_movement(frame)
-        
         if face_data['face_detected']:
-            for student_id in self.active_students.keys():
-                self.active_students[student_id]['attention_scores'].append(
-                    face_data['attention_score']
-                )
+            # Running sums instead of a per-frame list of scores
+            score = face_data['attention_score']
+            students.attention_sum[:active_count] += score
+            students.attention_count[:active_count] += 1
             
             if face_data['looking_away']:
-                new_looking_away = self.face_detector.update_looking_away_count(True)
+                new_looking_away = self.face_detector.update_looking_away_count(True, now)
                 if new_looking_away:
-                    for student_id in self.active_students.keys():
-                        self.active_students[student_id]['looking_away_count'] += 1
+                    students.looking_away_counts[:active_count] += 1
             else:
-                self.face_detector.update_looking_away_count(False)
+                self.face_detector.update_looking_away_count(False, now)
         
         return frame
     
@@ -411,57 +653,76 @@ class BehaviorTrackingGUI:
         if self.session_start_time:
             duration = datetime.now() - self.session_start_time
             duration_str = str(duration).split('.')[0]
-            self.session_time_label.config(text=duration_str)
+            self._set_text(self.session_time_label, duration_str)
         
-        # FPS (approximate)
-        self.fps_label.config(text="25-30")
+        # FPS over the last processed frames
+        frame_times = tuple(self.frame_times)
+        if len(frame_times) >= 2 and frame_times[-1] > frame_times[0]:
+            fps = (len(frame_times) - 1) / (frame_times[-1] - frame_times[0])
+            self._set_text(self.fps_label, f"{fps:.1f}")
         
         # Active students
-        self.students_label.config(text=str(len(self.active_students)))
+        students = self.students
+        count = len(students)
+        self._set_text(self.students_label, str(count))
         
         # Hand raises
         hand_raises = self.hand_detector.get_hand_raise_count()
-        self.hand_raises_label.config(text=str(hand_raises))
+        self._set_text(self.hand_raises_label, str(hand_raises))
         
         # Looking away
         looking_away = self.face_detector.get_looking_away_count()
-        self.looking_away_label.config(text=str(looking_away))
-        
-        # Average attention
-        if self.active_students:
-            total_attention = 0
-            count = 0
-            for data in self.active_students.values():
-                if data['attention_scores']:
-                    total_attention += np.mean(data['attention_scores'])
-                    count += 1
-            
-            if count > 0:
-                avg_attention = total_attention / count
-                self.attention_label.config(text=f"{avg_attention:.1f}%")
+        self._set_text(self.looking_away_label, str(looking_away))
+        
+        # Average attention over the students with at least one score; the
+        # per-student means are computed once and reused for the list
+        attention_means = students.average_attention(count)
+        if count:
+            measured = students.attention_count[:count] > 0
+            if measured.any():
+                avg_attention = attention_means[measured].mean()
+                self._set_text(self.attention_label, f"{avg_attention:.1f}%")
         
         # Update students list
-        self.update_students_list()
+        self.update_students_list(students, count, attention_means)
     
-    def update_students_list(self):
-        """Update active students list"""
-        self.students_text.delete(1.0, tk.END)
-        
-        if not self.active_students:
-            self.students_text.insert(tk.END, "No active students detected")
+    def update_students_list(self, students, count, attention_means):
+        """Update active students list (first count students, with their mean attention)"""
+        if not count:
+            self._set_students_text("No active students detected")
             return
         
-        for student_id, data in self.active_students.items():
-            avg_attention = np.mean(data['attention_scores']) if data['attention_scores'] else 0
-            
-            text = f"{data['name']}\n"
-            text += f"  ID: {student_id}\n"
-            text += f"  Attention: {avg_attention:.1f}%\n"
-            text += f"  Hand Raises: {data['hand_raises']}\n"
-            text += f"  Looking Away: {data['looking_away_count']}\n"
-            text += "-" * 30 + "\n"
-            
-            self.students_text.insert(tk.END, text)
+        # Build the whole list first and insert it with a single Tk call
+        separator = "-" * 30 + "\n"
+        parts = []
+        rows = zip(students.student_names[:count], students.student_ids[:count], attention_means.tolist(),
+                   students.hand_raises[:count].tolist(), students.looking_away_counts[:count].tolist())
+        for name, student_id, avg_attention, hand_raises, looking_away in rows:
+            parts.append(
+                f"{name}\n"
+                f"  ID: {student_id}\n"
+                f"  Attention: {avg_attention:.1f}%\n"
+                f"  Hand Raises: {hand_raises}\n"
+                f"  Looking Away: {looking_away}\n"
+                + separator
+            )
+        
+        self._set_students_text("".join(parts))
+    
+    def _set_students_text(self, text):
+        """Replace the active students list, unless it already shows this text"""
+        # Skipping the rewrite also keeps the user's scroll position
+        if text == self._shown_texts.get(self.students_text):
+            return
+        self._shown_texts[self.students_text] = text
+        self.students_text.delete(1.0, tk.END)
+        self.students_text.insert(tk.END, text)
+    
+    def _set_text(self, label, text):
+        """Set a label's text, skipping the Tk call when it is unchanged"""
+        if text != self._shown_texts.get(label):
+            self._shown_texts[label] = text
+            label.config(text=text)
     
     def save_session_report(self):
         """Save session report"""
@@ -470,26 +731,128 @@ class BehaviorTrackingGUI:
         
         session_date = datetime.now().date().isoformat()
         
-        for student_id, data in self.active_students.items():
-            avg_attention = np.mean(data['attention_scores']) if data['attention_scores'] else 0
-            student_duration = (data['last_seen'] - data['first_seen']).total_seconds()
-            
-            self.db.log_behavior(
-                student_id=student_id,
-                session_date=session_date,
-                attention_score=avg_attention,
-                hand_raises=data['hand_raises'],
-                looking_away_count=data['looking_away_count'],
-                total_duration=int(student_duration)
-            )
+        # Every student's averages and durations in one pass over the arrays
+        students = self.students
+        count = len(students)
+        rows = list(zip(students.student_ids[:count], [session_date] * count,
+                        students.average_attention(count).tolist(),
+                        students.hand_raises[:count].tolist(),
+                        students.looking_away_counts[:count].tolist(),
+                        students.durations(count).tolist()))
+        
+        # Save all students in one transaction, off the Tk thread
+        self._db_queue.put(('behaviors', (rows,)))
+    
+    def _db_worker(self):
+        """Apply queued database writes until a None sentinel is received"""
+        while True:
+            task = self._db_queue.get()
+            try:
+                if task is None:
+                    break
+                
+                action, args = task
+                if action == 'attendance':
+                    self.db.mark_attendance(*args)
+                elif action == 'behaviors':
+                    self.db.log_behaviors(*args)
+            finally:
+                self._db_queue.task_done()
+    
+    def on_close(self):
+        """Stop monitoring, flush pending database writes and close the window"""
+        if self.is_monitoring:
+            self.stop_monitoring()
+        if self.test_running:
+            self.close_test()
+        
+        self._db_queue.put(None)
+        self._db_thread.join()
+        self.db.close()
+        self.root.destroy()
+    
+    def get_students(self):
+        """Get all registered students (cached until the list changes)"""
+        return self._cached_students(self.students_version)
+    
+    def students_changed(self):
+        """Invalidate the cached student list"""
+        self.students_version += 1
+    
+    def ensure_face_system(self, then):
+        """Return True if face recognition is loaded; otherwise start loading it and call then() when done"""
+        if self.face_system is not None:
+            return True
+        self._load_in_background("Loading face recognition...", self._load_face_system, then)
+        return False
+    
+    def ensure_detectors(self, then):
+        """Return True if face recognition and the MediaPipe detectors are loaded; otherwise start loading them and call then() when done"""
+        if not self.ensure_face_system(then):
+            return False
+        if self.hand_detector is not None:
+            return True
+        self._load_in_background("Loading hand and face detectors...", self._load_gesture_detectors, then)
+        return False
+    
+    def _load_face_system(self):
+        """Import face recognition and load the known encodings (loader thread)"""
+        from face_recognition_module import FaceRecognitionSystem
+        self.face_system = FaceRecognitionSystem()
+    
+    def _load_gesture_detectors(self):
+        """Import MediaPipe and build the hand and face mesh graphs (loader thread)"""
+        from gesture_detection import HandGestureDetector, FaceMovementDetector, detect_hands_and_face, bgr_to_rgb
+        self.detect_hands_and_face = detect_hands_and_face
+        self.bgr_to_rgb = bgr_to_rgb
+        self.face_detector = FaceMovementDetector()
+        hand_detector = HandGestureDetector()
+        hand_detector.hand_skip = 1  # Hands on every 2nd frame
+        self.hand_detector = hand_detector  # Set last: marks the detectors as loaded
+    
+    def _load_in_background(self, message, load, then):
+        """Run a slow loader on a thread with a message in the status bar; then() runs on the Tk thread afterwards"""
+        if self.loader_thread is not None:
+            return  # Already loading; the pending callback covers this request
+        
+        self._loader_status = self.status_bar.cget('text')
+        self.status_bar.config(text=message)
+        self.root.config(cursor='watch')
+        self.loader_error = None
+        self.loader_thread = threading.Thread(target=self._run_loader, args=(load,), daemon=True)
+        self.loader_thread.start()
+        self.root.after(50, self._check_loader, then)
+    
+    def _run_loader(self, load):
+        """Run a loader, keeping any error for the Tk thread (loader thread)"""
+        try:
+            load()
+        except Exception as e:
+            self.loader_error = e
+    
+    def _check_loader(self, then):
+        """Call then() once the loader thread is done (Tk main thread)"""
+        if self.loader_thread.is_alive():
+            self.root.after(50, self._check_loader, then)
+            return
+        self.loader_thread = None
+        
+        self.root.config(cursor='')
+        self.status_bar.config(text=self._loader_status)
+        if self.loader_error is not None:
+            messagebox.showerror("Loading Error", f"Could not load the models: {self.loader_error}")
+            return
+        then()
     
     def open_register_window(self):
         """Open student registration window"""
-        RegisterWindow(self.root, self.db, self.face_system)
+        if not self.ensure_face_system(self.open_register_window):
+            return
+        RegisterWindow(self.root, self.db, self.face_system, self.students_changed)
     
     def view_students(self):
         """View all registered students"""
-        students = self.db.get_all_students()
+        students = self.get_students()
         
         if not students:
             messagebox.showinfo("No Students", "No students registered yet.")
@@ -538,40 +901,87 @@ class BehaviorTrackingGUI:
     
     def test_recognition(self):
         """Test face recognition"""
-        if self.is_monitoring:
+        if self.is_monitoring or self.camera_thread is not None:
             messagebox.showwarning("Already Monitoring", "Please stop monitoring first!")
             return
         
-        messagebox.showinfo(
-            "Test Mode",
-            "Camera will open for testing.\nPress 'q' to close."
-        )
+        if self.test_running:
+            self.test_window.lift()
+            return
         
-        cap = cv2.VideoCapture(0)
+        if not self.ensure_face_system(self.test_recognition):
+            return
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            recognized_students = self.face_system.recognize_faces(frame)
-            frame = self.face_system.draw_face_boxes(frame, recognized_students)
-            
-            cv2.putText(frame, "Press 'q' to quit", (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
-            cv2.imshow('Face Recognition Test', frame)
-            
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        self.test_cap = cv2.VideoCapture(0)
+        if not self.test_cap.isOpened():
+            self.test_cap.release()
+            self.test_cap = None
+            messagebox.showerror("Camera Error", "Could not open camera!")
+            return
+        
+        # Preview window; frames are read and shown from root.after ticks
+        # so the main window stays responsive during the test
+        self.test_window = tk.Toplevel(self.root)
+        self.test_window.title("Face Recognition Test")
+        self.test_window.configure(bg='#2C3E50')
+        self.test_window.protocol("WM_DELETE_WINDOW", self.close_test)
+        
+        self.test_photo = ImageTk.PhotoImage(Image.new('RGB', (640, 480)))
+        tk.Label(self.test_window, image=self.test_photo, bg='black').pack(padx=10, pady=10)
+        
+        tk.Button(
+            self.test_window,
+            text="✖ Close",
+            command=self.close_test,
+            bg='#E74C3C',
+            fg='white',
+            font=("Arial", 10, "bold"),
+            width=15,
+            cursor='hand2'
+        ).pack(pady=(0, 10))
+        
+        self.test_running = True
+        self.test_after_id = self.root.after(30, self.test_tick)
+    
+    def test_tick(self):
+        """Read, recognize and show one test frame, then reschedule"""
+        self.test_after_id = None
+        if not self.test_running:
+            return
+        
+        ret, frame = self.test_cap.read()
+        if not ret:
+            self.close_test()
+            return
         
-        cap.release()
-        cv2.destroyAllWindows()
+        recognized_students = self.face_system.recognize_faces(frame)
+        frame = self.face_system.draw_face_boxes(frame, recognized_students)
+        
+        resized = cv2.resize(frame, (640, 480), interpolation=cv2.INTER_LINEAR)
+        self.test_photo.paste(Image.fromarray(cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)))
+        
+        self.test_after_id = self.root.after(30, self.test_tick)
+    
+    def close_test(self):
+        """Stop the recognition test and close its window"""
+        self.test_running = False
+        if self.test_after_id is not None:
+            self.root.after_cancel(self.test_after_id)
+            self.test_after_id = None
+        
+        if self.test_cap is not None:
+            self.test_cap.release()
+            self.test_cap = None
+        
+        if self.test_window is not None:
+            self.test_window.destroy()
+            self.test_window = None
 
 class RegisterWindow:
-    def __init__(self, parent, db, face_system):
+    def __init__(self, parent, db, face_system, on_student_added=None):
         self.db = db
         self.face_system = face_system
+        self.on_student_added = on_student_added
         
         self.window = tk.Toplevel(parent)
         self.window.title("Register New Student")
@@ -644,6 +1054,9 @@ class RegisterWindow:
             messagebox.showerror("Error", message)
             return
         
+        if self.on_student_added is not None:
+            self.on_student_added()
+        
         # Capture face
         messagebox.showinfo(
             "Capture Face",
@@ -753,8 +1166,13 @@ class ReportWindow:
 
 def main():
     """Main entry point"""
+    parser = argparse.ArgumentParser(description="Student behavior tracking desktop app")
+    parser.add_argument('--opencl', action='store_true',
+                        help="Resize and convert the video display with OpenCL (NVIDIA or AMD GPU only)")
+    args = parser.parse_args()
+    
     root = tk.Tk()
-    app = BehaviorTrackingGUI(root)
+    app = BehaviorTrackingGUI(root, use_opencl=args.opencl)
     root.mainloop()
 
 if __name__ == "__main__":
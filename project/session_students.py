@@ -0,0 +1,71 @@
+"""
+Per-student session statistics shared by the CLI, desktop and web apps
+"""
+
+import numpy as np
+
+class SessionStudents:
+    """Per-student session data as parallel arrays (struct of arrays); row i belongs to student_ids[i]"""
+    
+    def __init__(self, capacity=32):
+        self.student_ids = []
+        self.student_names = []
+        self.student_index = {}  # student_id: row
+        self._allocate(capacity)
+    
+    def __len__(self):
+        return len(self.student_ids)
+    
+    def _allocate(self, capacity):
+        """Allocate (or grow) the per-student arrays to the given capacity"""
+        fields = {
+            'first_seen': np.float64,
+            'last_seen': np.float64,
+            'attention_sum': np.float64,
+            'attention_count': np.int64,
+            'hand_raises': np.int64,
+            'looking_away_counts': np.int64,
+            'total_frames_seen': np.int64,
+        }
+        count = len(self.student_ids)
+        for name, dtype in fields.items():
+            array = np.zeros(capacity, dtype=dtype)
+            if count:
+                array[:count] = getattr(self, name)[:count]
+            setattr(self, name, array)
+    
+    def add(self, student_id, name, timestamp):
+        """Assign the next row to a newly seen student"""
+        row = len(self.student_ids)
+        if row == len(self.attention_sum):
+            self._allocate(2 * row)
+        
+        # Fill the row before publishing it: readers on other threads only
+        # look at rows [0, len(student_ids))
+        self.first_seen[row] = timestamp
+        self.last_seen[row] = timestamp
+        self.student_names.append(name)
+        self.student_index[student_id] = row
+        self.student_ids.append(student_id)
+        return row
+    
+    def reset_counts(self):
+        """Zero the behavior counters but keep the students and their presence times"""
+        self.hand_raises[:] = 0
+        self.looking_away_counts[:] = 0
+        self.attention_sum[:] = 0.0
+        self.attention_count[:] = 0
+    
+    def average_attention(self, count=None):
+        """Average attention of the first count students (0 for students without a score)"""
+        if count is None:
+            count = len(self.student_ids)
+        attention_count = self.attention_count[:count]
+        return np.divide(self.attention_sum[:count], attention_count,
+                         out=np.zeros(count), where=attention_count > 0)
+    
+    def durations(self, count=None):
+        """Seconds each of the first count students has been present"""
+        if count is None:
+            count = len(self.student_ids)
+        return (self.last_seen[:count] - self.first_seen[:count]).astype(np.int64)
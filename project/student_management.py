@@ -1,3 +1,5 @@
+import argparse
+import csv
 import cv2
 from database import DatabaseManager
 from face_recognition_module import FaceRecognitionSystem
@@ -70,12 +72,16 @@ class StudentManagement:
         class_name = input("Enter Class/Section: ").strip()
         image_path = input("Enter image file path: ").strip()
         
+        self.add_student_with_image(student_id, name, image_path, email, class_name)
+    
+    def add_student_with_image(self, student_id, name, image_path, email="", class_name=""):
+        """Add a student to the database and register their face from an image file"""
         # Add to database
         success, message = self.db.add_student(student_id, name, email, class_name)
         
         if not success:
             print(f"❌ {message}")
-            return
+            return False
         
         print(f"✓ {message}")
         
@@ -86,6 +92,46 @@ class StudentManagement:
             print(f"✓ {message}")
         else:
             print(f"❌ {message}")
+        return success
+    
+    def bulk_register(self, csv_path, workers=None):
+        """Register every student in a CSV file (student_id, name, email, class_name, image_path columns)"""
+        with open(csv_path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        
+        # Add everyone to the database first; faces are only registered for
+        # the students that were added
+        entries = []
+        for row in rows:
+            student_id = (row.get('student_id') or '').strip()
+            name = (row.get('name') or '').strip()
+            if not student_id or not name:
+                print(f"❌ Skipping row without student ID or name: {row}")
+                continue
+            
+            success, message = self.db.add_student(student_id, name, (row.get('email') or '').strip(),
+                                                   (row.get('class_name') or '').strip())
+            if not success:
+                print(f"❌ {student_id}: {message}")
+                continue
+            entries.append(((row.get('image_path') or '').strip(), student_id, name))
+        
+        if not entries:
+            print("No students to register.")
+            return 0
+        
+        # Face encodings are computed in parallel across processes
+        results = self.face_system.register_students(entries, workers)
+        registered = 0
+        for (image_path, student_id, name), (success, message) in zip(entries, results):
+            if success:
+                registered += 1
+                print(f"✓ {student_id}: {message}")
+            else:
+                print(f"❌ {student_id}: {message}")
+        
+        print(f"\n✓ Registered {registered} of {len(rows)} student(s)")
+        return registered
     
     def view_all_students(self):
         """View all registered students"""
@@ -133,6 +179,10 @@ class StudentManagement:
         start_date = input("Start date (YYYY-MM-DD): ").strip() or None
         end_date = input("End date (YYYY-MM-DD): ").strip() or None
         
+        self.print_student_report(student_id, start_date, end_date)
+    
+    def print_student_report(self, student_id, start_date=None, end_date=None):
+        """Print the behavior report for a student"""
         # Get report
         report = self.db.get_student_report(student_id, start_date, end_date)
         
@@ -184,6 +234,13 @@ class StudentManagement:
         
         cap = cv2.VideoCapture(0)
         
+        # Ask for MJPEG at 640x480, which is cheaper to deliver than raw YUV,
+        # and keep the driver queue short so frames are never stale
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
         while True:
             ret, frame = cap.read()
             if not ret:
@@ -237,10 +294,52 @@ class StudentManagement:
             else:
                 print("❌ Invalid choice! Please try again.")
 
+def parse_args(argv=None):
+    """Parse command line arguments; without a command the interactive menu is shown"""
+    parser = argparse.ArgumentParser(description="Student management system")
+    subparsers = parser.add_subparsers(dest='command')
+    
+    register_image = subparsers.add_parser('register-image', help="Register a student from an image file")
+    register_image.add_argument('--student-id', required=True)
+    register_image.add_argument('--name', required=True)
+    register_image.add_argument('--image', required=True, help="Image file with the student's face")
+    register_image.add_argument('--email', default="")
+    register_image.add_argument('--class-name', default="")
+    
+    bulk_register = subparsers.add_parser('bulk-register', help="Register every student in a CSV file")
+    bulk_register.add_argument('--csv', required=True,
+                               help="CSV with student_id, name, email, class_name, image_path columns")
+    bulk_register.add_argument('--cpus', type=int, default=None,
+                               help="Processes used to encode faces (default: all CPUs)")
+    
+    subparsers.add_parser('list', help="List all registered students")
+    
+    report = subparsers.add_parser('report', help="Show a student's behavior report")
+    report.add_argument('--student-id', required=True)
+    report.add_argument('--start-date', default=None, help="YYYY-MM-DD")
+    report.add_argument('--end-date', default=None, help="YYYY-MM-DD")
+    
+    subparsers.add_parser('test', help="Test face recognition with the webcam")
+    
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
         management = StudentManagement()
-        management.main_menu()
+        if args.command == 'register-image':
+            management.add_student_with_image(args.student_id, args.name, args.image,
+                                              args.email, args.class_name)
+        elif args.command == 'bulk-register':
+            management.bulk_register(args.csv, args.cpus)
+        elif args.command == 'list':
+            management.view_all_students()
+        elif args.command == 'report':
+            management.print_student_report(args.student_id, args.start_date, args.end_date)
+        elif args.command == 'test':
+            management.test_face_recognition()
+        else:
+            management.main_menu()
     except KeyboardInterrupt:
         print("\n\n👋 Program interrupted by user. Goodbye!")
     except Exception as e:
@@ -6,27 +6,80 @@ Flask-based web interface
 from flask import Flask, render_template, Response, jsonify, request, redirect, url_for, flash
 import cv2
 import json
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from database import DatabaseManager
 from face_recognition_module import FaceRecognitionSystem
-from gesture_detection import HandGestureDetector, FaceMovementDetector
+from gesture_detection import HandGestureDetector, FaceMovementDetector, detect_hands_and_face, bgr_to_rgb
+from session_students import SessionStudents
 import numpy as np
 
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_422
+except ImportError:
+    TurboJPEG = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+def _accumulate(rows, attention, attention_n, hand_raise, looking_away,
+                attention_sum, attention_count, hand_raises, looking_away_counts):
+    """Add one frame's gesture results to the given student rows"""
+    for row in rows:
+        attention_sum[row] += attention
+        attention_count[row] += attention_n
+        hand_raises[row] += hand_raise
+        looking_away_counts[row] += looking_away
+
+# Compiled to a native loop when numba is installed. The explicit signature
+# compiles it here at import, not on the first frame while state_lock is held
+if njit is not None:
+    _accumulate = njit('void(int64[:], float64, int64, int64, int64, '
+                       'float64[:], int64[:], int64[:], int64[:])', cache=True)(_accumulate)
+
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here-change-in-production'
 
 # Initialize systems
 db = DatabaseManager()
-face_system = FaceRecognitionSystem()
+# Face recognition: 'cuda', 'cpu' or None to use the GPU when dlib can
+face_device = None
+face_system = FaceRecognitionSystem(device=face_device)
+print(f"Face recognition running on {'GPU' if face_system.use_cuda else 'CPU'}")
 hand_detector = HandGestureDetector()
 face_detector = FaceMovementDetector()
+detector_pool = ThreadPoolExecutor(max_workers=1)
+
+# libjpeg-turbo encodes the MJPEG stream when available (OpenCV otherwise);
+# the preview does not need more than quality 70 with 4:2:2 chroma
+jpeg_encoder = None
+if TurboJPEG is not None:
+    try:
+        jpeg_encoder = TurboJPEG()
+    except (OSError, RuntimeError):
+        # The Python wrapper is installed but the shared library is missing
+        jpeg_encoder = None
+jpeg_quality = 70
+
+# Multipart framing around each JPEG, yielded as separate chunks so the
+# JPEG bytes are never copied into a concatenated part
+frame_header = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+frame_tail = b'\r\n'
 
 # Global state
 monitoring_state = {
     'is_monitoring': False,
     'session_start_time': None,
-    'active_students': {},
+    'session_date_iso': None,
+    'active_students': SessionStudents(),
     'attendance_marked': set(),
+    'pending_attendance': [],
     'stats': {
         'hand_raises': 0,
         'looking_away': 0,
@@ -35,12 +88,254 @@ monitoring_state = {
     }
 }
 
+# Guards monitoring_state, which the pipeline threads update while request
+# threads read it
+state_lock = threading.RLock()
+
 camera = None
+pipeline = None
+
+# Registered students, re-read after students_version is bumped (register
+# does that) or after students_cache_ttl seconds, to pick up students added
+# by other programs sharing the database
+students_version = 0
+students_cache_ttl = 5.0
+
+@lru_cache(maxsize=1)
+def _cached_students(version, ttl_bucket):
+    """Read all students for one (version, ttl_bucket) pair"""
+    return tuple(db.get_all_students())
+
+def get_students():
+    """Get all registered students (cached until the list changes)"""
+    return _cached_students(students_version, int(time.monotonic() // students_cache_ttl))
+
+def students_changed():
+    """Invalidate the cached student list"""
+    global students_version
+    students_version += 1
+
+class FrameEnvelope:
+    """A camera frame and the results attached to it on its way through the pipeline"""
+    
+    # One envelope is created per camera frame; slots skip the per-instance dict
+    __slots__ = ('frame', 'rgb', 'scale', 'recognized_students', 'captured_at')
+    
+    def __init__(self, frame):
+        self.frame = frame
+        self.rgb = None
+        self.scale = 1.0  # size of rgb relative to frame
+        self.recognized_students = []
+        self.captured_at = time.monotonic()
+
+class FrameBuffers:
+    """Reusable camera, downscale and RGB buffers for the pipeline"""
+    
+    def __init__(self, pool_size=8):
+        # The downscaled BGR frame never leaves the recognizer stage, so one
+        # buffer is enough. Camera and RGB frames travel down the pipeline and
+        # are handed back by the last stage that uses them, or by _put_latest
+        # when their frame is dropped
+        self._small = None
+        self._free_frames = []
+        self._free_rgb = []
+        self._pool_size = pool_size
+        self._lock = threading.Lock()
+    
+    def read_frame(self, camera):
+        """Read the next camera frame, into a recycled buffer when one is free"""
+        with self._lock:
+            buffer = self._free_frames.pop() if self._free_frames else None
+        # OpenCV fills a buffer of the right size in place (and allocates a
+        # new frame if the camera resolution changed)
+        if buffer is None:
+            return camera.read()
+        return camera.read(buffer)
+    
+    def release_frame(self, frame):
+        """Return a camera frame once no stage uses it any more"""
+        with self._lock:
+            if len(self._free_frames) < self._pool_size:
+                self._free_frames.append(frame)
+    
+    def to_small_rgb(self, frame, width):
+        """Downscale a BGR frame to width and convert it to read-only RGB"""
+        h, w = frame.shape[:2]
+        if w > width:
+            size = (width, int(h * width / w))
+            if self._small is None or self._small.shape[:2] != (size[1], size[0]):
+                self._small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            frame = cv2.resize(frame, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        
+        with self._lock:
+            buffer = self._free_rgb.pop() if self._free_rgb else None
+        # bgr_to_rgb reallocates if the camera resolution changed
+        return bgr_to_rgb(frame, buffer)
+    
+    def release_rgb(self, rgb):
+        """Return an RGB buffer once no stage uses it any more"""
+        with self._lock:
+            if len(self._free_rgb) < self._pool_size:
+                self._free_rgb.append(rgb)
+
+class PipelineController:
+    """Camera -> face recognition -> gesture detection -> JPEG pipeline behind /video_feed"""
+    
+    def __init__(self, camera, queue_size=2):
+        self.camera = camera
+        
+        # Each stage runs on its own thread so a slow stage never stalls the
+        # camera; when a stage falls behind, the oldest frame is dropped
+        self.grab_q = queue.Queue(maxsize=queue_size)
+        self.detect_q = queue.Queue(maxsize=queue_size)
+        self.render_q = queue.Queue(maxsize=queue_size)
+        self.running = False
+        self._threads = []
+        
+        # Face recognition runs every N frames, or sooner once
+        # recognition_max_age seconds have passed since the last one finished;
+        # results are reused in between
+        self.recognition_interval = 3
+        self.recognition_max_age = 0.1
+        self.frame_count = 0
+        self.last_recognized_students = []
+        self.last_recognition_time = 0.0
+        
+        # Width of the downscaled frame fed to the detectors
+        self.inference_width = 320
+        self.buffers = FrameBuffers()
+        
+        # New attendance records are written in one transaction every N frames
+        self.attendance_flush_interval = 30
+        
+        # The newest JPEG, shared by every /video_feed viewer; frame_seq counts
+        # published frames so each viewer can wait for one it has not sent yet
+        self.frame_cv = threading.Condition()
+        self.latest_jpeg = None
+        self.frame_seq = 0
+        self.finished = False
+    
+    def start(self):
+        """Start the grabber, recognizer, gesture and encoder threads"""
+        self.running = True
+        self._threads = [
+            threading.Thread(target=self._grab_loop, daemon=True),
+            threading.Thread(target=self._recognize_loop, daemon=True),
+            threading.Thread(target=self._gesture_loop, daemon=True),
+            threading.Thread(target=self._encode_loop, daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+    
+    def stop(self):
+        """Stop all stages and wait for them to finish"""
+        self.running = False
+        # No timeout: a stage still inside a slow dlib or MediaPipe call would
+        # otherwise write into the report being saved, or into the next
+        # session's students. Every stage checks running between frames
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+    
+    def _grab_loop(self):
+        """Stage 1: read camera frames"""
+        while self.running:
+            success, frame = self.buffers.read_frame(self.camera)
+            if not success:
+                break
+            self._put_latest(self.grab_q, FrameEnvelope(frame))
+        self._put_latest(self.grab_q, None)
+    
+    def _recognize_loop(self):
+        """Stage 2: face recognition and attendance"""
+        while self.running:
+            try:
+                envelope = self.grab_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if envelope is None:
+                break
+            
+            # Downscale and convert once; the small RGB frame is shared with
+            # the gesture stage (landmarks are normalized, boxes are scaled back up)
+            envelope.rgb = self.buffers.to_small_rgb(envelope.frame, self.inference_width)
+            envelope.scale = envelope.rgb.shape[1] / envelope.frame.shape[1]
+            
+            if (self.frame_count % self.recognition_interval == 0 or
+                    time.monotonic() - self.last_recognition_time > self.recognition_max_age):
+                self.last_recognized_students = recognize_frame(envelope)
+                # Measured from when recognition returned, so a slow
+                # recognition does not make the next frame look stale too
+                self.last_recognition_time = time.monotonic()
+            else:
+                recognize_frame(envelope, self.last_recognized_students)
+            self.frame_count += 1
+            
+            if self.frame_count % self.attendance_flush_interval == 0:
+                flush_attendance()
+            
+            self._put_latest(self.detect_q, envelope)
+        self._put_latest(self.detect_q, None)
+    
+    def _gesture_loop(self):
+        """Stage 3: hand and face movement detection"""
+        while self.running:
+            try:
+                envelope = self.detect_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if envelope is None:
+                break
+            
+            detect_gestures(envelope)
+            self.buffers.release_rgb(envelope.rgb)
+            envelope.rgb = None
+            self._put_latest(self.render_q, envelope)
+        self._put_latest(self.render_q, None)
+    
+    def _encode_loop(self):
+        """Stage 4: encode finished frames and publish them to all viewers"""
+        while self.running:
+            try:
+                envelope = self.render_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if envelope is None:
+                break
+            
+            jpeg = encode_jpeg(envelope.frame)
+            self.buffers.release_frame(envelope.frame)
+            with self.frame_cv:
+                self.latest_jpeg = jpeg
+                self.frame_seq += 1
+                self.frame_cv.notify_all()
+        
+        # Wake the viewers so they notice the pipeline has stopped
+        with self.frame_cv:
+            self.finished = True
+            self.frame_cv.notify_all()
+    
+    def _put_latest(self, q, item):
+        """Put an item, dropping the oldest queued item if the queue is full"""
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = q.get_nowait()
+                except queue.Empty:
+                    continue
+                # A dropped frame's buffers go back to the pools
+                if dropped is not None:
+                    if dropped.rgb is not None:
+                        self.buffers.release_rgb(dropped.rgb)
+                    self.buffers.release_frame(dropped.frame)
 
 @app.route('/')
 def index():
     """Home page"""
-    students = db.get_all_students()
+    students = get_students()
     return render_template('index.html', 
                          student_count=len(students),
                          monitoring=monitoring_state['is_monitoring'])
@@ -57,6 +352,7 @@ def register():
         success, message = db.add_student(student_id, name, email, class_name)
         
         if success:
+            students_changed()
             flash(message, 'success')
             return redirect(url_for('capture_face', student_id=student_id, name=name))
         else:
@@ -72,7 +368,7 @@ def capture_face(student_id, name):
 @app.route('/students')
 def students():
     """View all students"""
-    all_students = db.get_all_students()
+    all_students = get_students()
     return render_template('students.html', students=all_students)
 
 @app.route('/monitor')
@@ -83,15 +379,15 @@ def monitor():
 @app.route('/reports')
 def reports():
     """Reports page"""
-    all_students = db.get_all_students()
+    all_students = get_students()
     return render_template('reports.html', students=all_students)
 
 @app.route('/api/start_monitoring', methods=['POST'])
 def start_monitoring():
     """Start monitoring session"""
-    global camera, monitoring_state
+    global camera, pipeline, monitoring_state
     
-    students = db.get_all_students()
+    students = get_students()
     if not students:
         return jsonify({'success': False, 'message': 'No students registered!'})
     
@@ -100,14 +396,27 @@ def start_monitoring():
         if not camera.isOpened():
             return jsonify({'success': False, 'message': 'Could not open camera!'})
         
-        monitoring_state['is_monitoring'] = True
-        monitoring_state['session_start_time'] = datetime.now()
-        monitoring_state['active_students'] = {}
-        monitoring_state['attendance_marked'] = set()
+        # Ask for MJPEG at 640x480, which is cheaper to deliver than raw YUV,
+        # and keep the driver queue short so frames are never stale
+        camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
+        with state_lock:
+            monitoring_state['is_monitoring'] = True
+            monitoring_state['session_start_time'] = datetime.now()
+            monitoring_state['session_date_iso'] = monitoring_state['session_start_time'].date().isoformat()
+            monitoring_state['active_students'] = SessionStudents()
+            monitoring_state['attendance_marked'] = set()
+            monitoring_state['pending_attendance'] = []
         
         hand_detector.reset_count()
         face_detector.reset_count()
         
+        pipeline = PipelineController(camera)
+        pipeline.start()
+        
         return jsonify({'success': True, 'message': 'Monitoring started!'})
     
     return jsonify({'success': False, 'message': 'Already monitoring!'})
@@ -115,16 +424,22 @@ def start_monitoring():
 @app.route('/api/stop_monitoring', methods=['POST'])
 def stop_monitoring():
     """Stop monitoring session"""
-    global camera, monitoring_state
+    global camera, pipeline, monitoring_state
     
     if monitoring_state['is_monitoring']:
         monitoring_state['is_monitoring'] = False
         
+        # Stop the pipeline before releasing the camera it reads from
+        if pipeline:
+            pipeline.stop()
+            pipeline = None
+        
         if camera:
             camera.release()
             camera = None
         
-        # Save session report
+        # Write any attendance still pending, then the session report
+        flush_attendance()
         save_session_report()
         
         return jsonify({'success': True, 'message': 'Monitoring stopped!'})
@@ -140,34 +455,36 @@ def get_stats():
     else:
         duration_str = "00:00:00"
     
-    # Calculate average attention
-    if monitoring_state['active_students']:
-        total_attention = 0
-        count = 0
-        for data in monitoring_state['active_students'].values():
-            if data['attention_scores']:
-                total_attention += np.mean(data['attention_scores'])
-                count += 1
+    with state_lock:
+        students = monitoring_state['active_students']
+        active_count = len(students)
         
-        avg_attention = (total_attention / count) if count > 0 else 0
-    else:
-        avg_attention = 0
-    
-    return jsonify({
-        'duration': duration_str,
-        'active_students': len(monitoring_state['active_students']),
-        'hand_raises': hand_detector.get_hand_raise_count(),
-        'looking_away': face_detector.get_looking_away_count(),
-        'avg_attention': f"{avg_attention:.1f}",
-        'students_list': [
+        # Calculate average attention over the students that have a score
+        attention = students.average_attention()
+        has_attention = students.attention_count[:active_count] > 0
+        avg_attention = attention[has_attention].mean() if has_attention.any() else 0
+        
+        students_list = [
             {
-                'name': data['name'],
+                'name': name,
                 'id': sid,
-                'attention': f"{np.mean(data['attention_scores']):.1f}" if data['attention_scores'] else "0",
-                'hand_raises': data['hand_raises']
+                'attention': f"{student_attention:.1f}" if scored else "0",
+                'hand_raises': raises
             }
-            for sid, data in monitoring_state['active_students'].items()
+            for sid, name, student_attention, scored, raises in zip(
+                students.student_ids, students.student_names, attention.tolist(),
+                has_attention.tolist(), students.hand_raises[:active_count].tolist())
         ]
+        hand_raises = hand_detector.get_hand_raise_count()
+        looking_away = face_detector.get_looking_away_count()
+    
+    return jsonify({
+        'duration': duration_str,
+        'active_students': active_count,
+        'hand_raises': hand_raises,
+        'looking_away': looking_away,
+        'avg_attention': f"{avg_attention:.1f}",
+        'students_list': students_list
     })
 
 @app.route('/api/report/<student_id>')
@@ -178,24 +495,21 @@ def get_report(student_id):
     if not report:
         return jsonify({'success': False, 'message': 'No records found'})
     
-    report_data = []
-    total_attention = 0
-    total_hand_raises = 0
-    total_looking_away = 0
-    
-    for record in report:
-        report_data.append({
+    report_data = [
+        {
             'date': record[0],
             'attention': record[1],
             'hand_raises': record[2],
             'looking_away': record[3],
             'duration': record[4] / 60
-        })
-        
-        total_attention += record[1]
-        total_hand_raises += record[2]
-        total_looking_away += record[3]
+        }
+        for record in report
+    ]
     
+    # Sum the attention, hand raise and looking away columns in one reduction
+    total_attention, total_hand_raises, total_looking_away = np.array(
+        [record[1:4] for record in report], dtype=np.float64
+    ).sum(axis=0)
     num_sessions = len(report)
     
     return jsonify({
@@ -203,99 +517,140 @@ def get_report(student_id):
         'report': report_data,
         'summary': {
             'sessions': num_sessions,
-            'avg_attention': total_attention / num_sessions if num_sessions > 0 else 0,
-            'total_hand_raises': total_hand_raises,
-            'total_looking_away': total_looking_away
+            'avg_attention': float(total_attention) / num_sessions,
+            'total_hand_raises': int(total_hand_raises),
+            'total_looking_away': int(total_looking_away)
         }
     })
 
 def generate_frames():
     """Generate video frames"""
-    global camera, monitoring_state
+    # The pipeline threads do all the work, including encoding; every viewer
+    # just waits for the next shared JPEG and yields it
+    controller = pipeline
+    last_seq = 0
     
-    while monitoring_state['is_monitoring']:
-        if camera is None or not camera.isOpened():
-            break
-        
-        success, frame = camera.read()
-        if not success:
-            break
-        
-        # Process frame
-        frame = process_frame(frame)
-        
-        # Encode frame
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
+    while monitoring_state['is_monitoring'] and controller is not None:
+        with controller.frame_cv:
+            controller.frame_cv.wait_for(
+                lambda: controller.frame_seq != last_seq or controller.finished, timeout=1.0
+            )
+            if controller.finished:
+                break
+            if controller.frame_seq == last_seq:
+                continue
+            last_seq = controller.frame_seq
+            jpeg = controller.latest_jpeg
         
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+        yield frame_header
+        yield jpeg
+        yield frame_tail
 
-def process_frame(frame):
-    """Process video frame"""
-    current_time = datetime.now()
-    current_date = current_time.date().isoformat()
+def encode_jpeg(frame):
+    """Encode a BGR frame as JPEG bytes"""
+    if jpeg_encoder is not None:
+        return jpeg_encoder.encode(frame, quality=jpeg_quality, pixel_format=TJPF_BGR,
+                                   jpeg_subsample=TJSAMP_422)
     
-    # Face Recognition
-    recognized_students = face_system.recognize_faces(frame)
-    frame = face_system.draw_face_boxes(frame, recognized_students)
+    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    return buffer.tobytes()
+
+def recognize_frame(envelope, recognized_students=None):
+    """Recognize faces in a frame and update attendance (recognizer stage)"""
+    # Pass recognized_students to reuse an earlier result instead of running
+    # face recognition again; returns the students used for this frame
+    # Seen times are monotonic seconds; wall-clock time is only needed for
+    # the attendance record
+    current_time = envelope.captured_at
+    
+    # Face Recognition (envelope.rgb is the frame's own downscaled RGB copy, as
+    # stages work on different frames at the same time)
+    if recognized_students is None:
+        recognized_students = face_system.recognize_faces_rgb(envelope.rgb, envelope.scale)
+    envelope.recognized_students = recognized_students
+    envelope.frame = face_system.draw_face_boxes(envelope.frame, recognized_students)
     
     # Update active students
-    for student in recognized_students:
-        if student['student_id']:
-            student_id = student['student_id']
-            
-            if student_id not in monitoring_state['active_students']:
-                monitoring_state['active_students'][student_id] = {
-                    'name': student['name'],
-                    'first_seen': current_time,
-                    'last_seen': current_time,
-                    'hand_raises': 0,
-                    'looking_away_count': 0,
-                    'attention_scores': [],
-                    'total_frames': 0
-                }
-            
-            monitoring_state['active_students'][student_id]['last_seen'] = current_time
-            monitoring_state['active_students'][student_id]['total_frames'] += 1
-            
-            # Mark attendance
-            if student_id not in monitoring_state['attendance_marked']:
-                time_in = current_time.strftime("%H:%M:%S")
-                db.mark_attendance(student_id, current_date, time_in)
-                monitoring_state['attendance_marked'].add(student_id)
-    
-    # Hand Detection
-    hand_data, hand_results = hand_detector.detect_hands(frame)
+    with state_lock:
+        students = monitoring_state['active_students']
+        for student in recognized_students:
+            if student['student_id']:
+                student_id = student['student_id']
+                
+                row = students.student_index.get(student_id)
+                if row is None:
+                    row = students.add(student_id, student['name'], current_time)
+                
+                students.last_seen[row] = current_time
+                students.total_frames_seen[row] += 1
+                
+                # Mark attendance (written by flush_attendance)
+                if student_id not in monitoring_state['attendance_marked']:
+                    monitoring_state['attendance_marked'].add(student_id)
+                    time_in = datetime.now().strftime("%H:%M:%S")
+                    monitoring_state['pending_attendance'].append(
+                        (student_id, monitoring_state['session_date_iso'], time_in, 'Present')
+                    )
+    
+    return recognized_students
+
+def flush_attendance():
+    """Write pending attendance records to the database in one transaction"""
+    # Take the rows under the lock, write them outside it so stats requests
+    # never wait on disk
+    with state_lock:
+        rows = monitoring_state['pending_attendance']
+        monitoring_state['pending_attendance'] = []
+    
+    if rows:
+        db.mark_attendances(rows)
+
+def detect_gestures(envelope):
+    """Detect hand raises and face movement in a frame (gesture stage)"""
+    # With no face in view there is nobody to attribute gestures to, so idle
+    # frames only cost face recognition
+    if not envelope.recognized_students:
+        return
+    
+    now = time.monotonic()  # for the gesture debounce timers
+    frame = envelope.frame
+    
+    # Gestures are attributed only to the students in this frame, not to
+    # everyone seen earlier in the session
+    currently_visible = {s['student_id'] for s in envelope.recognized_students if s['student_id']}
+    
+    # Hand and face movement detection, run concurrently
+    hand_data, hand_results, face_data, _ = detect_hands_and_face(
+        hand_detector, face_detector, envelope.rgb, detector_pool
+    )
+    
     if hand_data['hands_detected']:
         frame = hand_detector.draw_hand_landmarks(frame, hand_results)
-        
-        if hand_data['hand_raised']:
-            new_raise = hand_detector.update_hand_raise_count(True)
-            if new_raise:
-                for student_id in monitoring_state['active_students'].keys():
-                    monitoring_state['active_students'][student_id]['hand_raises'] += 1
-        else:
-            hand_detector.update_hand_raise_count(False)
     
-    # Face Movement
-    face_data, _ = face_detector.detect_face_movement(frame)
-    
-    if face_data['face_detected']:
-        for student_id in monitoring_state['active_students'].keys():
-            monitoring_state['active_students'][student_id]['attention_scores'].append(
-                face_data['attention_score']
-            )
+    with state_lock:
+        # Hand Detection
+        new_raise = False
+        if hand_data['hands_detected']:
+            new_raise = hand_detector.update_hand_raise_count(hand_data['hand_raised'], now)
         
-        if face_data['looking_away']:
-            new_looking_away = face_detector.update_looking_away_count(True)
-            if new_looking_away:
-                for student_id in monitoring_state['active_students'].keys():
-                    monitoring_state['active_students'][student_id]['looking_away_count'] += 1
-        else:
-            face_detector.update_looking_away_count(False)
+        # Face Movement
+        new_looking_away = False
+        if face_data['face_detected']:
+            new_looking_away = face_detector.update_looking_away_count(face_data['looking_away'], now)
+        
+        # Apply this frame's results to the visible students in one call
+        students = monitoring_state['active_students']
+        rows = np.array([students.student_index[student_id] for student_id in currently_visible],
+                        dtype=np.int64)
+        _accumulate(rows,
+                    face_data['attention_score'] if face_data['face_detected'] else 0.0,
+                    1 if face_data['face_detected'] else 0,
+                    1 if new_raise else 0,
+                    1 if new_looking_away else 0,
+                    students.attention_sum, students.attention_count,
+                    students.hand_raises, students.looking_away_counts)
     
-    return frame
+    envelope.frame = frame
 
 @app.route('/video_feed')
 def video_feed():
@@ -308,20 +663,25 @@ def save_session_report():
     if not monitoring_state['session_start_time']:
         return
     
-    session_date = datetime.now().date().isoformat()
+    # Build every row under the lock, then write them in one transaction
+    with state_lock:
+        session_date = monitoring_state['session_date_iso']
+        students = monitoring_state['active_students']
+        count = len(students)
+        rows = list(zip(students.student_ids, [session_date] * count,
+                        students.average_attention().tolist(),
+                        students.hand_raises[:count].tolist(),
+                        students.looking_away_counts[:count].tolist(),
+                        students.durations().tolist()))
     
-    for student_id, data in monitoring_state['active_students'].items():
-        avg_attention = np.mean(data['attention_scores']) if data['attention_scores'] else 0
-        student_duration = (data['last_seen'] - data['first_seen']).total_seconds()
-        
-        db.log_behavior(
-            student_id=student_id,
-            session_date=session_date,
-            attention_score=avg_attention,
-            hand_raises=data['hand_raises'],
-            looking_away_count=data['looking_away_count'],
-            total_duration=int(student_duration)
-        )
+    if rows:
+        db.log_behaviors(rows)
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Every request gets its own thread. Inference runs on the pipeline's
+    # threads (OpenCV, dlib and MediaPipe release the GIL while they work) and
+    # /video_feed responses only wait for the next shared JPEG, so /api/stats
+    # stays responsive while frames are streaming. No debug mode: its
+    # reloader imports this module twice (loading every model twice) and its
+    # debugger must not be reachable on 0.0.0.0
+    app.run(host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file